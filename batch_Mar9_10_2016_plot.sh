@@ -1,23 +1,2 @@
 #!/usr/bin/env bash
-./tmc_plot.py --file_list ./Mar9_10_2016_list/00_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/01_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/02_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/03_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/04_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/05_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/06_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/07_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/18_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/19_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/20_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/21_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/22_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/23_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/24_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/25_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/26_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/27_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/28_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-./tmc_plot.py --file_list ./Mar9_10_2016_list/29_2n2222_list.txt --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
-
-
+./tmc_batch.py --list_dir ./Mar9_10_2016_list --tstart "2016/03/09-21:00:00" --save_dir Mar9_10_2016_plots
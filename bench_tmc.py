@@ -0,0 +1,583 @@
+#!/usr/bin/env python
+
+######################################################
+# Benchmarks for the TMC data path.
+#
+# Writes synthetic log files shaped like the DAQ output
+# and times the old line-at-a-time code against the
+# bulk readers in tmc_io.
+######################################################
+
+import numpy as np
+import datetime as dt
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import tmc_io
+import tmc_align
+import tmc_pipeline
+import tmc_sweep
+import tmc_shared
+import tmc_batch
+import tmc_noise
+import tmc_pyramid
+import tmc_figures
+import tmc_overview
+import multiprocessing
+from moving_average import moving_average, moving_average2
+
+###############################################################
+# Write a fake log: one line every 3 s, ncol values per line
+def write_fake_log(fname, nlines, ncol, t0=dt.datetime(2016, 3, 9, 0, 0, 0)):
+    rng = np.random.RandomState(0)
+    values = 1.E-6*rng.randn(nlines, ncol)
+    f_data = open(fname, 'w')
+    for i in range(nlines):
+        now = t0 + dt.timedelta(seconds=3*i)
+        f_data.write(now.strftime('%Y/%m/%d-%H:%M:%S') + '\t' +
+                     ' '.join(['%e' % v for v in values[i]]) + '\n')
+    f_data.close()
+
+###############################################################
+# The original per-line reader from tmc_plot_v5.py
+def read_lines_reference(fname, col, tstart_ts, tstop_ts):
+    s_data = []
+    s_time = []
+    f_data = open(fname)
+    for line in f_data:
+        date = re.split(r'[\t:/\n-]\s*', line)
+        now = dt.datetime(int(date[0]), int(date[1]), int(date[2]),
+                          int(date[3]), int(date[4]), int(date[5]))
+        tnow_ts = time.mktime(now.timetuple())
+        if (tnow_ts > tstart_ts) and (tnow_ts < tstop_ts):
+            s_time.append(now)
+            split_line = line.split('\t')[1].split(' ')
+            s_data.append(float(split_line[col]))
+    f_data.close()
+    return s_time, s_data
+
+###############################################################
+# The original O(n*w) averages from tmc_plot_v5.py
+def moving_average_reference(interval, window_size):
+    window = np.ones(int(window_size))/float(window_size)
+    result = np.convolve(interval, window, 'same')
+    for i in range(len(result)):
+        if i < window_size:
+            result[i] = np.sum(interval[:i+1])/float(i+1)
+        elif i > (len(result)-window_size-1):
+            result[i] = np.sum(interval[i:])/float(len(result)-i)
+    return result
+
+def moving_average2_reference(interval, window_size):
+    result = np.zeros(len(interval))
+    for i in range(len(result)):
+        if i < window_size:
+            result[i] = np.sum(interval[:i+1])/float(i+1)
+        else:
+            result[i] = np.sum(interval[i-window_size:i])/float(window_size)
+    return result
+
+###############################################################
+# Time a function, best of nrep
+def best_time(func, nrep=3):
+    best = None
+    for i in range(nrep):
+        t0 = time.time()
+        func()
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return best
+
+###############################################################
+# Lines/sec of the reference and bulk parsers
+def bench_parse(tmp_dir, nlines, ncol):
+    fname = os.path.join(tmp_dir, 'ADCBaseline_%d.txt' % ncol)
+    write_fake_log(fname, nlines, ncol)
+    t_ref = best_time(lambda: read_lines_reference(fname, 1 % ncol, 0, 0xFFFFFFFF))
+    t_bulk = best_time(lambda: tmc_io.read_column(fname, 1 % ncol, 0, 0xFFFFFFFF))
+    ref_data = read_lines_reference(fname, 1 % ncol, 0, 0xFFFFFFFF)[1]
+    bulk_data = tmc_io.read_column(fname, 1 % ncol, 0, 0xFFFFFFFF)[1]
+    assert np.array_equal(np.array(ref_data), bulk_data)
+    print('parse %d lines x %d cols: reference %.0f lines/s, bulk %.0f lines/s (x%.1f)' %
+          (nlines, ncol, nlines/t_ref, nlines/t_bulk, t_ref/t_bulk))
+
+###############################################################
+# re.split + datetime + time.mktime per line vs. decode_stamps
+def bench_stamps(nlines):
+    t0 = dt.datetime(2016, 3, 9, 0, 0, 0)
+    stamps = [(t0 + dt.timedelta(seconds=3*i)).strftime('%Y/%m/%d-%H:%M:%S').encode('ascii')
+              for i in range(nlines)]
+    def reference():
+        out = []
+        for s in stamps:
+            date = re.split(r'[\t:/\n-]\s*', s.decode('ascii'))
+            now = dt.datetime(int(date[0]), int(date[1]), int(date[2]),
+                              int(date[3]), int(date[4]), int(date[5]))
+            out.append(time.mktime(now.timetuple()))
+        return out
+    t_ref = best_time(reference)
+    t_fast = best_time(lambda: tmc_io.decode_stamps(stamps))
+    assert np.array_equal(np.array(reference()), tmc_io.decode_stamps(stamps))
+    print('timestamps %d lines: reference %.0f lines/s, decode_stamps %.0f lines/s (x%.1f)' %
+          (nlines, nlines/t_ref, nlines/t_fast, t_ref/t_fast))
+
+###############################################################
+# Peak memory of the list based data path vs. GrowArray with
+# in-place scaling, for nfiles files of nlines samples each.
+# Each path runs in a child process of its own and reports how
+# far its peak resident size (ru_maxrss) rose above where it
+# started, which works the same on Python 2 and 3.
+def _memory_chunks(nlines, nfiles):
+    return [(1457499600 + 3*np.arange(i*nlines, (i+1)*nlines, dtype=np.int64),
+             1.E-6*np.ones(nlines)) for i in range(nfiles)]
+
+def _memory_lists(chunks):
+    t0 = dt.datetime(2016, 3, 9, 0, 0, 0)
+    s_time = []
+    s_data = []
+    for ts, data in chunks:
+        s_time.extend([t0 + dt.timedelta(seconds=int(t - chunks[0][0][0])) for t in ts])
+        s_data.extend([float(x) for x in data])
+    s_data = [1.E6*x for x in s_data]
+    timestamps = [time.mktime(x.timetuple()) for x in s_time]
+    return s_data, timestamps
+
+def _memory_arrays(chunks):
+    s_time = tmc_io.GrowArray(np.int64)
+    s_data = tmc_io.GrowArray(np.float64)
+    for ts, data in chunks:
+        s_time.extend(ts)
+        s_data.extend(data)
+    s_data = s_data.array()
+    s_data *= 1.E6
+    return s_data, s_time.array()
+
+def _max_rss():
+    # Bytes on macOS, kB elsewhere
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else 1024*rss
+
+def _memory_worker(func, nlines, nfiles, conn):
+    chunks = _memory_chunks(nlines, nfiles)
+    before = _max_rss()
+    func(chunks)
+    conn.send(_max_rss() - before)
+    conn.close()
+
+def bench_memory(nlines, nfiles=10):
+    peaks = []
+    for func in (_memory_lists, _memory_arrays):
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=_memory_worker, args=(func, nlines, nfiles, child))
+        proc.start()
+        peaks.append(max(parent.recv(), 1))
+        proc.join()
+    print('memory %d samples: lists %.1f MB peak, GrowArray %.1f MB peak (x%.1f)' %
+          (nlines*nfiles, peaks[0]/1.E6, peaks[1]/1.E6, peaks[0]/float(peaks[1])))
+
+###############################################################
+# Cumulative sum averages vs. the originals: same output, and
+# the speed for the 1 minute and baseline drift windows
+def bench_moving_average(nlines):
+    rng = np.random.RandomState(0)
+    for n in (1, 7, 19, 20, 21, 39, 40, 41, 200):
+        for w in (1, 2, 19, 20, 21):
+            x = 625000. + rng.randn(n)
+            assert np.allclose(moving_average(x, w), moving_average_reference(x, w), rtol=0, atol=1.E-6)
+            assert np.allclose(moving_average2(x, w), moving_average2_reference(x, w), rtol=0, atol=1.E-6)
+    x = 625000. + rng.randn(nlines)
+    for func, ref, w in ((moving_average, moving_average_reference, 20),
+                         (moving_average2, moving_average2_reference, 2000)):
+        t_ref = best_time(lambda: ref(x, w), 1)
+        t_fast = best_time(lambda: func(x, w))
+        err = np.max(np.abs(func(x, w) - ref(x, w)))
+        print('%s %d samples, window %d: reference %.1f ms, cumsum %.2f ms (x%.0f), max diff %.1e uV' %
+              (func.__name__, nlines, w, 1.E3*t_ref, 1.E3*t_fast, t_ref/t_fast, err))
+
+###############################################################
+# Five interp1d objects vs. one shared alignment, for streams
+# logged on the same timebase
+def bench_align(nlines):
+    from scipy import interpolate
+    t_src = 1457499600 + 3*np.arange(nlines, dtype=np.int64)
+    data = np.random.RandomState(0).randn(5, nlines)
+    sources = [(t_src, d) for d in data]
+    for t_dst, name in ((t_src[10:-10], 'on-tick'), (t_src[10:-10] + 1., 'off-tick')):
+        t_ref = best_time(lambda: [interpolate.interp1d(t, d)(t_dst) for t, d in sources])
+        t_fast = best_time(lambda: tmc_align.align(t_dst, sources))
+        print('align 5 streams x %d samples %s: interp1d %.2f ms, shared alignment %.2f ms' %
+              (nlines, name, 1.E3*t_ref, 1.E3*t_fast))
+    # A clock step back leaves the source times out of order;
+    # interp1d sorts them and so must the alignment
+    t_step = t_src.copy()
+    t_step[nlines//2:] -= 7
+    t_dst = t_step[10:nlines//2 - 10] + 1.
+    assert np.allclose(tmc_align.align(t_dst, [(t_step, data[0])])[0],
+                       interpolate.interp1d(t_step, data[0])(t_dst), rtol=0, atol=1.E-9)
+
+###############################################################
+# Cold parse vs. warm cache hit
+def bench_cache(tmp_dir, nlines, ncol):
+    fname = os.path.join(tmp_dir, 'ADCTemps_%d.txt' % ncol)
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    write_fake_log(fname, nlines, ncol)
+    t_cold = best_time(lambda: tmc_io.parse_log(fname))
+    tmc_io.cached_parse_log(fname, cache_dir)
+    t_warm = best_time(lambda: tmc_io.cached_parse_log(fname, cache_dir))
+    print('cache %d lines x %d cols: parse %.1f ms, cache hit %.2f ms' %
+          (nlines, ncol, 1.E3*t_cold, 1.E3*t_warm))
+
+###############################################################
+# One hour out of a day: full parse vs. indexed window read
+def bench_window(tmp_dir, nlines, ncol):
+    fname = os.path.join(tmp_dir, 'BoardTemps_%d.txt' % ncol)
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    write_fake_log(fname, nlines, ncol)
+    ts = tmc_io.parse_log(fname)[0]
+    tstart_ts = ts[len(ts)//2]
+    tstop_ts = tstart_ts + 3600
+    t_full = best_time(lambda: tmc_io.select_window(ts, tmc_io.parse_log(fname)[1], tstart_ts, tstop_ts))
+    tmc_io.build_index(fname, cache_dir)
+    t_window = best_time(lambda: tmc_io.read_window(fname, tstart_ts, tstop_ts, cache_dir))
+    print('1 hour window of %d lines: full parse %.1f ms, indexed %.2f ms' %
+          (nlines, 1.E3*t_full, 1.E3*t_window))
+
+###############################################################
+# Full v5 chain vs. a rerun after changing Tk with the stage
+# memo: only rd_correct and the stages after it are redone
+def bench_memo(nlines):
+    rng = np.random.RandomState(0)
+    env = {'vt1': 625000. + rng.randn(nlines), 'vi1': 100. + rng.randn(nlines),
+           'vb1': 625000. + rng.randn(nlines), 'tat': rng.randn(nlines),
+           'tbt': rng.randn(nlines)}
+    pipeline = tmc_pipeline.Pipeline(tmc_pipeline.CHAINS['v5'])
+    memo = tmc_pipeline.StageMemo()
+    t_full = best_time(lambda: pipeline.run(env))
+    pipeline.run(env, memo)
+    def tune():
+        pipeline.set_param('vt3', 'Tk', 170. + 10.*rng.rand())
+        pipeline.run(env, memo)
+    t_tune = best_time(tune)
+    assert pipeline.recomputed == ['vt3', 'vt4', 'vt4']
+    assert np.array_equal(pipeline.run(env, memo)['vt4'], pipeline.run(env)['vt4'])
+    print('v5 chain %d samples: full run %.1f ms, rerun after a Tk change %.1f ms' %
+          (nlines, 1.E3*t_full, 1.E3*t_tune))
+
+###############################################################
+# A Tk x gain grid over several channels: one Pipeline run per
+# point vs. the broadcast sweep
+def bench_sweep(nlines, nchan=12):
+    rng = np.random.RandomState(0)
+    raw = {'vt1': 625000. + rng.randn(nchan, nlines), 'vi1': 100. + rng.randn(nchan, nlines),
+           'vb1': 625000. + rng.randn(nchan, nlines), 'tat': rng.randn(nchan, nlines),
+           'tbt': rng.randn(nchan, nlines)}
+    chain = tmc_pipeline.CHAINS['v5']
+    grid = [('vt3', 'Tk', np.linspace(170., 190., 11)), ('vt2', 'gain', np.array([1.5, 2., 2.5]))]
+    def one_by_one():
+        pipeline = tmc_pipeline.Pipeline(chain)
+        rms = []
+        for tk in grid[0][2]:
+            for gain in grid[1][2]:
+                pipeline.set_param('vt3', 'Tk', tk)
+                pipeline.set_param('vt2', 'gain', gain)
+                rms.append(np.std(pipeline.run(raw)['vt4'], axis=-1))
+        return np.array(rms)
+    t_ref = best_time(one_by_one, 1)
+    t_sweep = best_time(lambda: tmc_sweep.sweep(chain, raw, grid))
+    assert np.allclose(tmc_sweep.sweep(chain, raw, grid)[1]['vt4'], one_by_one(), rtol=1.E-12)
+    print('sweep 33 points x %d channels x %d samples: one by one %.2f s, broadcast %.2f s' %
+          (nchan, nlines, t_ref, t_sweep))
+
+###############################################################
+# v5 chain on 30 channels in a pool of workers: arrays pickled
+# to and from the workers vs. the shared channel matrix
+def _pickled_chain(raw):
+    result = tmc_pipeline.Pipeline(tmc_pipeline.CHAINS['v5']).run(raw)
+    return result['vt3'], result['vt4']
+
+def bench_shared(nlines, jobs=4):
+    rng = np.random.RandomState(0)
+    schs = ['%02d' % sch for sch in range(tmc_shared.NSCH)]
+    raw = {'vt1': 625000. + rng.randn(len(schs), nlines)}
+    for name in ('vi1', 'vb1', 'tat', 'tbt'):
+        raw[name] = 625000. + rng.randn(len(schs), nlines)
+    # The baseline and ADC temperature are shared per ADC, the
+    # board temperature per board; the current is per channel
+    for name, i in (('vb1', 0), ('tat', 0), ('tbt', 2)):
+        raw[name][:] = raw[name][[tmc_io.channel_map(sch)[i] for sch in schs]]
+    chain = tmc_pipeline.CHAINS['v5']
+    runs = tmc_shared.split_channels(schs, jobs)
+
+    def pickled():
+        pool = multiprocessing.Pool(jobs)
+        slices = [dict((k, v[int(run[0]):int(run[-1]) + 1]) for k, v in raw.items()) for run in runs]
+        results = pool.map(_pickled_chain, slices)
+        pool.close()
+        pool.join()
+        return np.vstack([r[1] for r in results])
+
+    matrix = tmc_shared.ChannelMatrix(nlines, ['vt3', 'vt4'], create=True)
+    try:
+        matrix.fill(schs, np.arange(nlines), raw)
+        def shared():
+            pool = multiprocessing.Pool(jobs)
+            pool.map(tmc_batch._chain_worker, [(matrix.descriptor(), run, chain) for run in runs])
+            pool.close()
+            pool.join()
+            return matrix.get('vt4', schs)
+        t_pickled = best_time(pickled)
+        t_shared = best_time(shared)
+        assert np.array_equal(pickled(), shared())
+    finally:
+        matrix.close()
+        matrix.unlink()
+    print('v5 chain %d channels x %d samples, %d workers: pickled %.2f s, shared matrix %.2f s' %
+          (len(schs), nlines, jobs, t_pickled, t_shared))
+
+###############################################################
+# Lag search over +-200 samples: a dot product per lag and
+# channel vs. the batched FFT cross-correlation
+def bench_lag(nlines, nchan=30, max_lag=200):
+    rng = np.random.RandomState(0)
+    walk = moving_average2(rng.randn(nchan, nlines + 2*max_lag), 20)
+    lags = rng.randint(-max_lag//2, max_lag//2, nchan)
+    a = walk[:, max_lag:max_lag + nlines]
+    b = np.array([walk[c, max_lag - lags[c]:max_lag - lags[c] + nlines] for c in range(nchan)])
+    def sliding():
+        out = []
+        for c in range(nchan):
+            x = a[c] - np.mean(a[c])
+            y = b[c] - np.mean(b[c])
+            corr = [np.dot(x[max(0, -k):nlines - max(0, k)], y[max(0, k):nlines - max(0, -k)])
+                    for k in range(-max_lag, max_lag + 1)]
+            out.append(np.argmax(np.abs(corr)) - max_lag)
+        return np.array(out)
+    t_ref = best_time(sliding, 1)
+    t_fft = best_time(lambda: tmc_pipeline.estimate_lag(a, b, max_lag))
+    assert np.array_equal(tmc_pipeline.estimate_lag(a, b, max_lag), lags)
+    assert np.array_equal(sliding(), lags)
+    print('lag search %d channels x %d samples, +-%d: sliding %.2f s, FFT %.3f s' %
+          (nchan, nlines, max_lag, t_ref, t_fft))
+
+###############################################################
+# Fit on four nuisance signals: np.linalg.lstsq per channel on
+# the full design matrix vs. the batched chunked normal
+# equations
+def bench_regression(nlines, nchan=30):
+    rng = np.random.RandomState(0)
+    xs = [np.cumsum(rng.randn(nchan, nlines), axis=-1) for i in range(4)]
+    y = 0.5*xs[0] - 1.25*xs[1] + 2.E-3*xs[2] + xs[3] + rng.randn(nchan, nlines)
+    def per_channel():
+        beta = []
+        for c in range(nchan):
+            X = np.column_stack([x[c] for x in xs] + [np.ones(nlines)])
+            beta.append(np.linalg.lstsq(X, y[c], rcond=None)[0][:4])
+        return np.array(beta)
+    t_ref = best_time(per_channel, 1)
+    t_fit = best_time(lambda: tmc_pipeline.fit_regression(y, xs))
+    assert np.allclose(tmc_pipeline.fit_regression(y, xs)[0], per_channel(), rtol=0, atol=1.E-8)
+    print('regression %d channels x %d samples on 4 signals: lstsq per channel %.2f s, batched %.2f s' %
+          (nchan, nlines, t_ref, t_fit))
+
+###############################################################
+# Streaming Butterworth fed in random sized chunks must match
+# one call bit for bit; times the zero-phase and causal stages
+def bench_filter(nlines, nchan=30):
+    rng = np.random.RandomState(0)
+    t = 1457499600. + 3.*np.arange(nlines)
+    x = 625000. + np.cumsum(rng.randn(nchan, nlines), axis=-1)
+    one_shot = tmc_pipeline.butter_causal(x, t, cutoff=1./120)
+    stream = tmc_pipeline.StreamingSOS(1./120, tmc_pipeline.sample_rate(t))
+    bounds = np.sort(np.concatenate(([0, nlines], rng.randint(0, nlines, 50))))
+    chunks = [stream.process(x[:, b0:b1]) for b0, b1 in zip(bounds[:-1], bounds[1:])]
+    assert np.array_equal(np.concatenate(chunks, axis=-1), one_shot)
+    t_zero = best_time(lambda: tmc_pipeline.butter_zero_phase(x, t, cutoff=1./120))
+    t_causal = best_time(lambda: tmc_pipeline.butter_causal(x, t, cutoff=1./120))
+    print('butterworth %d channels x %d samples: zero-phase %.1f ms, causal %.1f ms, chunked == one-shot' %
+          (nchan, nlines, 1.E3*t_zero, 1.E3*t_causal))
+
+###############################################################
+# Overlapping Allan deviation at every octave tau: the mean of
+# each window summed directly vs. cumulative sums, all
+# channels at once
+def bench_allan(nlines, nchan=30):
+    x = np.random.RandomState(0).randn(nchan, nlines)
+    lengths = tmc_noise.octave_lengths(nlines)
+    def direct():
+        adev = np.empty((nchan, len(lengths)))
+        for i, m in enumerate(lengths):
+            y = np.apply_along_axis(lambda r: np.convolve(r, np.ones(m)/m, 'valid'), -1, x)
+            d = y[:, m:] - y[:, :-m]
+            adev[:, i] = np.sqrt(0.5*np.mean(d*d, axis=-1))
+        return adev
+    t_ref = best_time(direct, 1)
+    t_fast = best_time(lambda: tmc_noise.allan_deviation(x, lengths))
+    assert np.allclose(direct(), tmc_noise.allan_deviation(x, lengths), rtol=1.E-6)
+    print('allan deviation %d channels x %d samples, %d taus up to %d s: direct %.2f s, cumsum %.3f s' %
+          (nchan, nlines, len(lengths), 3*lengths[-1], t_ref, t_fast))
+
+###############################################################
+# One week of 6 channels: min/max of a day at 2000 points by
+# scanning the samples vs. from the cached pyramid
+def bench_pyramid(tmp_dir, nlines, ncol=6, days=7, npix=2000):
+    fname = os.path.join(tmp_dir, 'ADCBaseline_week.txt')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    write_fake_log(fname, days*nlines, ncol)
+    ts, values = tmc_io.cached_parse_log(fname, cache_dir)
+    tstart_ts = ts[len(ts)//2]
+    tstop_ts = tstart_ts + 86400
+    def scan():
+        x = tmc_io.select_window(ts, values, tstart_ts, tstop_ts)[1]
+        m = len(x)//npix*npix
+        x = x[:m].reshape(npix, -1, ncol)
+        return x.min(axis=1), x.max(axis=1)
+    # Streamed in chunks straight from the memory-mapped cache,
+    # same as built in one go
+    t_build = best_time(lambda: tmc_pyramid.build_pyramid(ts, values), 1)
+    pyramid = tmc_pyramid.build_pyramid(ts, values)
+    whole = tmc_pyramid.build_pyramid(np.array(ts), np.array(values), len(ts))
+    for name in ('t0', 't1', 'vmin', 'vmax', 'vsum', 'count', 'offsets'):
+        assert np.array_equal(getattr(pyramid, name), getattr(whole, name))
+    base = os.path.join(cache_dir, 'pyramid')
+    tmc_pyramid.save_pyramid(base, pyramid)
+    def query():
+        pyramid = tmc_pyramid.load_pyramid(base)
+        k = pyramid.level_for(tstart_ts, tstop_ts, npix)
+        return pyramid.window(k, tstart_ts, tstop_ts)
+    t_scan = best_time(scan)
+    t_query = best_time(query)
+    t0, t1, vmin, vmax = query()[:4]
+    x = tmc_io.select_window(ts, values, t0[1], t1[-2])[1]
+    assert np.array_equal(vmin[1:-1].min(axis=0), x.min(axis=0))
+    assert np.array_equal(vmax[1:-1].max(axis=0), x.max(axis=0))
+    print('pyramid %d lines x %d cols: streaming build %.1f ms, 1 day at %d points: scan %.1f ms, cached pyramid %.2f ms (%d points)' %
+          (days*nlines, ncol, 1.E3*t_build, npix, 1.E3*t_scan, 1.E3*t_query, len(t0)))
+
+###############################################################
+# Draw time of one long series, plain ax.plot vs. decimated to
+# the axes width, for spans of 1, 7 and 30 days
+def bench_decimate(nlines):
+    for days in (1, 7, 30):
+        n = days*nlines
+        t = np.arange(n)*3./86400
+        y = np.random.RandomState(0).randn(n)
+        y[n//3] = 100.
+        times = []
+        for plot in (lambda ax: ax.plot(t, y), lambda ax: tmc_figures.plot_decimated(ax, t, y)):
+            figure = tmc_figures.new_figure()
+            ax = figure.add_subplot(111)
+            plot(ax)
+            figure.canvas.draw()
+            times.append(best_time(figure.canvas.draw))
+            assert ax.get_ylim()[1] > 100.
+        print('draw %d days (%d points): plain %.1f ms, decimated %.1f ms' %
+              (days, n, 1.E3*times[0], 1.E3*times[1]))
+
+###############################################################
+# Saving nchan five-panel PNGs: a new figure per channel vs.
+# one PanelFigure whose line data is swapped
+def bench_render(tmp_dir, nlines, nchan=6):
+    t = tmc_io.epoch_to_local(1457481600 + 3*np.arange(nlines))
+    y = np.random.RandomState(0).randn(nchan, nlines)
+    def fresh():
+        for i in range(nchan):
+            figure = tmc_figures.new_figure()
+            tmc_figures.draw_panels(figure, *([t, y[i]]*5))
+            tmc_figures.save_png(figure, os.path.join(tmp_dir, 'fresh_%d.png' % i))
+    def reuse():
+        panels = tmc_figures.PanelFigure()
+        for i in range(nchan):
+            panels.update(*([t, y[i]]*5))
+            tmc_figures.save_png(panels.figure, os.path.join(tmp_dir, 'reuse_%d.png' % i))
+    t_fresh = best_time(fresh, 1)
+    t_reuse = best_time(reuse, 1)
+    for i in range(nchan):
+        assert open(os.path.join(tmp_dir, 'fresh_%d.png' % i), 'rb').read() == \
+            open(os.path.join(tmp_dir, 'reuse_%d.png' % i), 'rb').read()
+    print('%d channel PNGs of %d samples: new figures %.2f s, reused figure %.2f s' %
+          (nchan, nlines, t_fresh, t_reuse))
+
+###############################################################
+# 30 channels over a week to PNG: a subplot and plot per
+# channel vs. the pyramid overview in one axes
+def bench_overview(tmp_dir, nlines, nchan=30, days=7):
+    n = days*nlines
+    ts = 1457481600 + 3*np.arange(n)
+    x = 0.2*np.random.RandomState(0).randn(nchan, n)
+    def subplots():
+        figure = tmc_figures.new_figure()
+        t = tmc_figures.epoch_to_num(ts)
+        for i in range(nchan):
+            ax = figure.add_subplot(5, 6, i + 1)
+            ax.plot(t, x[i])
+            ax.set_ylim(-1, 1)
+        figure.set_size_inches(16, 8.5)
+        tmc_figures.save_png(figure, os.path.join(tmp_dir, 'subplots.png'))
+    def overview():
+        figure = tmc_figures.new_figure()
+        tmc_overview.overview(figure, ['%02d' % i for i in range(nchan)], ts, x)
+        tmc_figures.save_png(figure, os.path.join(tmp_dir, 'overview.png'))
+    t_ref = best_time(subplots, 1)
+    t_fast = best_time(overview)
+    print('overview %d channels x %d samples: subplots %.2f s, pyramid overview %.2f s' %
+          (nchan, n, t_ref, t_fast))
+
+###############################################################
+# Refetching the visible part of a long series at 1000 pixels
+# for a zoom to the whole span, a day and an hour: decimating
+# the samples in view vs. the matching pyramid level
+def bench_zoom(nlines, days=28, npix=1000):
+    n = days*nlines
+    t = np.arange(n)*3./86400
+    y = np.random.RandomState(0).randn(n)
+    plain = tmc_figures.DecimatedLine(t, y)
+    t0 = time.time()
+    pyramid = tmc_figures.PyramidLine(t, y)
+    t_build = time.time() - t0
+    for span in (days, 1., 1./24):
+        x0 = t[n//2] - span/2
+        x1 = x0 + span
+        t_plain = best_time(lambda: plain._decimate(x0, x1, npix))
+        t_pyramid = best_time(lambda: pyramid._decimate(x0, x1, npix))
+        assert np.max(pyramid.get_ydata()) == np.max(plain.get_ydata())
+        print('zoom to %g days of %d: samples %.2f ms, pyramid %.3f ms (%d points, built in %.2f s)' %
+              (span, days, 1.E3*t_plain, 1.E3*t_pyramid, len(pyramid.get_xdata()), t_build))
+
+###############################################################
+# For running independently
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog="bench_tmc",description="Benchmarks for the TMC data path.")
+    parser.add_argument('--nlines',type=int,default=28800,help='Lines per fake log file (default: one day)')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        bench_stamps(args.nlines)
+        bench_parse(tmp_dir, args.nlines, 1)
+        bench_parse(tmp_dir, args.nlines, 5)
+        bench_memory(args.nlines)
+        bench_moving_average(args.nlines)
+        bench_align(args.nlines)
+        bench_cache(tmp_dir, args.nlines, 5)
+        bench_window(tmp_dir, args.nlines, 5)
+        bench_memo(args.nlines)
+        bench_sweep(args.nlines)
+        bench_shared(args.nlines)
+        bench_lag(args.nlines)
+        bench_regression(args.nlines)
+        bench_filter(args.nlines)
+        bench_allan(args.nlines)
+        bench_pyramid(tmp_dir, args.nlines)
+        bench_decimate(args.nlines)
+        bench_render(tmp_dir, args.nlines)
+        bench_overview(tmp_dir, args.nlines)
+        bench_zoom(args.nlines)
+    finally:
+        shutil.rmtree(tmp_dir)
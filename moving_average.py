@@ -2,26 +2,72 @@
 
 ######################################################
 # Tyler Anderson Mon Mar 14 13:16:41 EDT 2016
-# 
-# A way to take an inteligent moving average: 
-# Use the history to 
+#
+# A way to take an inteligent moving average:
+# Use the history to
+#
+# Both averages work from a single cumulative sum, so
+# they are O(n) whatever the window size. The mean is
+# taken out before summing to keep the running sum
+# small and the differences accurate.
 ######################################################
 import numpy as np
 
 ###############################################################
-# Take the moving average
+# Running sum of x - ref along the last axis with a leading
+# zero: sum(x[..., a:b]) is c[..., b] - c[..., a] + ref*(b-a)
+def _cumsum(x):
+    if x.shape[-1]:
+        ref = np.mean(x, axis=-1)[..., None]
+    else:
+        ref = np.zeros(x.shape[:-1] + (1,))
+    c = np.zeros(x.shape[:-1] + (x.shape[-1] + 1,))
+    np.cumsum(x - ref, axis=-1, out=c[..., 1:])
+    return c, ref
+
+###############################################################
+# Take the moving average: centered ('same' convolution) in
+# the middle, the mean of everything up to i for the first
+# window_size samples and of everything from i on for the
+# last window_size samples. Works along the last axis, so a
+# (channels x samples) array is averaged in one call.
 def moving_average(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.convolve(interval, window, 'same')
-    # print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        elif i > (len(result)-window_size-1):
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i:])/float(len(result)-i)
-            
-    
-    # print result[0],result[len(result)-1]
+    x = np.asarray(interval, dtype=np.float64)
+    w = int(window_size)
+    n = x.shape[-1]
+    c, ref = _cumsum(x)
+    # np.convolve(..., 'same') returns the longer of the two
+    m = max(n, w)
+    i = np.arange(m)
+    result = np.empty(x.shape[:-1] + (m,))
+    head = i < w
+    tail = ~head & (i > m - w - 1)
+    mid = ~head & ~tail
+
+    ih = i[head]
+    k = np.minimum(ih + 1, n)
+    result[..., head] = (c[..., k] + ref*k)/(ih + 1)
+    it = i[tail]
+    result[..., tail] = (c[..., n:n+1] - c[..., it])/(n - it) + ref
+    off = (w - 1)//2
+    im = i[mid]
+    result[..., mid] = (c[..., im + off + 1] - c[..., im + off + 1 - w])/w + ref
+    return result
+
+###############################################################
+# Take the moving average.
+# This one is a pure history function: avoids discontinuity at
+# the boundaries
+def moving_average2(interval, window_size):
+    x = np.asarray(interval, dtype=np.float64)
+    w = int(window_size)
+    n = x.shape[-1]
+    c, ref = _cumsum(x)
+    i = np.arange(n)
+    result = np.empty(x.shape)
+    head = i < w
+    ih = i[head]
+    result[..., head] = c[..., ih + 1]/(ih + 1) + ref
+    it = i[~head]
+    result[..., ~head] = (c[..., it] - c[..., it - w])/w + ref
     return result
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+######################################################
+# Common timebase alignment for the TMC streams.
+#
+# Linear interpolation onto a target timebase, with the
+# bracketing search and weights computed once per
+# (source, target) timebase pair and then applied to
+# every stream sharing that source timebase in one go.
+# Results match scipy.interpolate.interp1d (linear) to
+# rounding, including its sorting of unordered source
+# times.
+######################################################
+
+import numpy as np
+
+###############################################################
+# Precomputed linear interpolation from t_src onto t_dst
+class Alignment(object):
+    def __init__(self, t_src, t_dst):
+        t_src = np.asarray(t_src, dtype=np.float64)
+        t_dst = np.asarray(t_dst, dtype=np.float64)
+        if len(t_src) < 2:
+            raise ValueError('need at least two source samples to interpolate')
+        # Out of order source times (a clock step back) are sorted
+        # first, as interp1d does, and the data indices mapped back
+        order = None
+        if np.any(np.diff(t_src) < 0):
+            order = np.argsort(t_src, kind='mergesort')
+            t_src = t_src[order]
+        if len(t_dst) and (t_dst.min() < t_src[0] or t_dst.max() > t_src[-1]):
+            raise ValueError('A value in x_new is outside the interpolation range.')
+        # Interpolating the sample index does the bracketing search
+        # and the weights in a single pass over the sorted targets
+        pos = np.interp(t_dst, t_src, np.arange(len(t_src), dtype=np.float64))
+        self.lo = np.minimum(pos.astype(np.intp), len(t_src) - 2)
+        self.weight = pos - self.lo
+        self.hi = self.lo + 1
+        if order is not None:
+            self.lo = order[self.lo]
+            self.hi = order[self.hi]
+        # Targets that are a run of the source samples themselves
+        # (streams logged on the same tick) are just a slice
+        self.slice = None
+        if order is None and len(t_dst) and not np.any(self.weight[:-1]) and self.weight[-1] in (0., 1.):
+            i0 = int(self.lo[0])
+            if np.array_equal(t_src[i0:i0 + len(t_dst)], t_dst):
+                self.slice = slice(i0, i0 + len(t_dst))
+
+    # data is (streams x source samples) or a single stream;
+    # returns (streams x target samples) or a single stream
+    def apply(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if self.slice is not None:
+            return data[..., self.slice]
+        y = np.take(data, self.hi, axis=-1)
+        y_lo = np.take(data, self.lo, axis=-1)
+        y -= y_lo
+        y *= self.weight
+        y += y_lo
+        return y
+
+###############################################################
+# Align a list of (t_src, data) streams onto t_dst. Streams
+# that share a timebase go through one Alignment together.
+# Returns a (streams x samples) array in the order given.
+def align(t_dst, sources):
+    groups = []  # [t_src, [stream indices]]
+    for i, (t_src, data) in enumerate(sources):
+        for group in groups:
+            if group[0] is t_src or (len(group[0]) == len(t_src) and
+                                     np.array_equal(group[0], t_src)):
+                group[1].append(i)
+                break
+        else:
+            groups.append([t_src, [i]])
+    out = np.empty((len(sources), len(t_dst)))
+    for t_src, members in groups:
+        engine = Alignment(t_src, t_dst)
+        if len(members) == 1:
+            out[members[0]] = engine.apply(sources[members[0]][1])
+        else:
+            out[members] = engine.apply(np.vstack([sources[i][1] for i in members]))
+    return out
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+######################################################
+# Batch processing of many TMC channels in one go.
+#
+# Replaces running tmc_plot once per channel list: the
+# shared TestCurrent/ADCBaseline/ADCTemps/BoardTemps
+# files are parsed once, the correction chain runs on
+# all channels together as (channels x samples) arrays,
+# and the per-channel <sch>.png figures are rendered
+# by a pool of worker processes on the Agg canvas,
+# without pyplot or a display. Each worker lays its
+# figure out once and only swaps the line data for
+# every further channel.
+# Every channel is aligned on its own 2N2222 ticks, as
+# tmc_plot_v5.py does; the workers share the aligned data
+# through a shared-memory channel matrix (tmc_shared.py)
+# per timebase.
+# Writes rms_summary.txt next to the PNGs and, with
+# --report, a multi-page PDF of every channel
+# (tmc_report.py).
+#
+# Usage:
+#   ./tmc_batch.py --list_dir Mar9_10_2016_list \
+#       --tstart 2016/03/09-21:00:00 --save_dir Mar9_10_2016_plots
+#   ./tmc_batch.py --data_dir ../Mar10_2016 --channels 0-7,18-29 \
+#       --save_dir Mar9_10_2016_plots
+#   ./tmc_batch.py --list_dir Mar9_10_2016_list \
+#       --save_dir Mar9_10_2016_plots --report Mar9_10_2016_report.pdf
+######################################################
+
+import numpy as np
+import multiprocessing
+import os
+import time
+
+import tmc_io
+import tmc_channels
+import tmc_pipeline
+import tmc_figures
+import tmc_shared
+import tmc_report
+
+###############################################################
+# Every worker attaches to a shared channel matrix (one per
+# timebase) the first time a job names it; the jobs only name
+# the matrix and the channels to work on
+_matrix = None
+_time_local = None
+_panels = None
+
+def _attach(descriptor):
+    global _matrix, _time_local
+    if _matrix is None or _matrix.name != descriptor[0]:
+        _detach()
+        _matrix = tmc_shared.ChannelMatrix.attach(descriptor)
+        _time_local = None
+
+def _detach():
+    global _matrix
+    if _matrix is not None:
+        _matrix.close()
+        _matrix = None
+
+###############################################################
+# Run the chain on a run of channels, writing the outputs the
+# matrix has rows for back in place
+def _chain_worker(job):
+    descriptor, schs, chain = job
+    _attach(descriptor)
+    result = tmc_pipeline.Pipeline(chain).run(_matrix.raw(schs))
+    for out in _matrix.outs:
+        _matrix.put(out, schs, result[out])
+
+###############################################################
+# Render save_dir/<sch>.png of one channel's raw signals, the
+# figure the old scripts saved
+def _render_worker(job):
+    global _time_local, _panels
+    descriptor, sch, save_dir = job
+    _attach(descriptor)
+    if _time_local is None:
+        _time_local = tmc_io.epoch_to_local(_matrix.time())
+    if _panels is None:
+        _panels = tmc_figures.PanelFigure()
+    t = _time_local
+    raw = _matrix.raw([sch])
+    _panels.update(t, raw['vt1'][0],
+                   t, raw['vi1'][0],
+                   t, raw['tat'][0],
+                   t, raw['tbt'][0],
+                   t, raw['vb1'][0])
+    fname = os.path.join(save_dir, sch + '.png')
+    tmc_figures.save_png(_panels.figure, fname)
+    return fname
+
+###############################################################
+# Load, correct and plot a set of (sch, sources) channels. Each
+# channel is aligned on its own timebase, as tmc_plot_v5.py
+# does, and every group of channels sharing a timebase goes
+# into a shared channel matrix of its own. A pool of jobs
+# workers runs the chain on runs of channels and renders the
+# figures from the matrices. With report, the PDF report is
+# written from the same matrices. Returns (schs, rms) with rms
+# mapping every 'rms' stage of the chain to the per-channel RMS
+# in uV.
+def run_batch(channels, tstart_ts, tstop_ts, chain, save_dir, store=None, jobs=1, verbose=False,
+              report=None):
+    groups = tmc_channels.load_groups(channels, tstart_ts, tstop_ts, store, jobs)
+    schs = [sch for sch, sources in channels]
+    if verbose:
+        for group_schs, time_ts, raw in groups:
+            print('Loaded %d channels x %d samples' % (len(group_schs), len(time_ts)))
+    rms_outs = [spec['out'] for spec in chain if spec.get('rms')]
+    outs = list(rms_outs)
+    if report is not None:
+        outs.extend([out for out in tmc_report.report_outs(chain) if out not in outs])
+    matrices = []
+    try:
+        for group_schs, time_ts, raw in groups:
+            matrix = tmc_shared.ChannelMatrix(len(time_ts), outs, create=True)
+            matrices.append((matrix, group_schs))
+            matrix.fill(group_schs, time_ts, raw)
+        del groups, raw
+        if not os.path.isdir(save_dir):
+            os.makedirs(save_dir)
+        chain_jobs = [(matrix.descriptor(), run, chain) for matrix, group_schs in matrices
+                      for run in tmc_shared.split_channels(group_schs, jobs)]
+        render_jobs = [(matrix.descriptor(), sch, save_dir) for matrix, group_schs in matrices
+                       for sch in group_schs]
+        if jobs > 1 and len(schs) > 1:
+            pool = multiprocessing.Pool(min(jobs, len(schs)))
+            pool.map(_chain_worker, chain_jobs)
+            fnames = pool.map(_render_worker, render_jobs)
+            pool.close()
+            pool.join()
+        else:
+            for job in chain_jobs:
+                _chain_worker(job)
+            fnames = [_render_worker(job) for job in render_jobs]
+            _detach()
+        rms = {}
+        for out in rms_outs:
+            by_sch = {}
+            for matrix, group_schs in matrices:
+                by_sch.update(zip(group_schs, np.std(matrix.get(out, group_schs), axis=-1)))
+            rms[out] = np.array([by_sch[sch] for sch in schs])
+        if report is not None:
+            tmc_report.write_report(report, matrices, chain, format_summary(schs, rms, chain))
+    finally:
+        for matrix, group_schs in matrices:
+            matrix.close()
+            matrix.unlink()
+    if verbose:
+        for fname in fnames:
+            print(fname)
+        if report is not None:
+            print(report)
+    return schs, rms
+
+###############################################################
+# RMS table, one row per channel, every 'rms' stage in uV and mK
+def format_summary(schs, rms, chain):
+    outs = [spec['out'] for spec in chain if spec.get('rms')]
+    lines = ['# sch  ' + '  '.join(['%12s  %12s' % (out + ' (uV)', out + ' (mK)') for out in outs])]
+    for i, sch in enumerate(schs):
+        lines.append('%5s  ' % sch + '  '.join(['%12f  %12f' % (rms[out][i], rms[out][i]/2.5)
+                                                for out in outs]))
+    return '\n'.join(lines) + '\n'
+
+###############################################################
+# For running independently
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog="tmc_batch",description="Process and plot many TMC channels in one run.")
+    tmc_channels.add_channel_args(parser)
+    parser.add_argument('--save_dir',type=str,default='.',help='Directory in which to save plots and the RMS summary (default: .)')
+    parser.add_argument('--chain',type=str,default='v5',help='Correction chain: v2, v3, v5, regress or a JSON file (default: v5)')
+    parser.add_argument('--max_lag',type=int,default=0,help='Line the current and baseline up with the 2N2222 signal of each channel first: their lags are estimated by FFT cross-correlation, searching up to this many samples (e.g. 40, two minutes), and undone before the corrections. Opt-in (default: 0, off): the peak found on streams without a common swing is noise, and off keeps the results of the original scripts')
+    parser.add_argument('--jobs',type=int,default=multiprocessing.cpu_count(),help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--report',type=str,help='Also write a multi-page PDF report to this file: RMS summary, then the raw, stage and mK pages of every channel')
+    parser.add_argument('--verbose',help='Print additional debugging info',action='store_true')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    channels, tstart_ts, tstop_ts, store = tmc_channels.channel_args(parser, args)
+    chain = tmc_pipeline.load_chain(args.chain)
+    if args.max_lag > 0:
+        chain = tmc_pipeline.lagged_chain(chain, max_lag=args.max_lag)
+    schs, rms = run_batch(channels, tstart_ts, tstop_ts, chain, args.save_dir,
+                          store, args.jobs, args.verbose, args.report)
+
+    summary = format_summary(schs, rms, chain)
+    f_out = open(os.path.join(args.save_dir, 'rms_summary.txt'), 'w')
+    f_out.write(summary)
+    f_out.close()
+    print(summary.rstrip('\n'))
+    print('%d channels in %.2f s' % (len(schs), time.time() - t0))
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+######################################################
+# Loading whole TMC channels.
+#
+# A channel is described by a file list like the ones
+# in Mar9_10_2016_list/: the 2N2222 files of one
+# system channel plus the TestCurrent, ADCBaseline,
+# ADCTemps and BoardTemps files it shares with the
+# other channels. This does what tmc_plot_v5.py does
+# for one list (read, scale, align onto the 2N2222
+# timebase) for any number of lists at once, giving
+# (channels x samples) arrays of the raw signals the
+# correction chains start from.
+######################################################
+
+import numpy as np
+import glob
+import os
+import warnings
+
+import tmc_io
+import tmc_align
+
+STREAMS = ('2n2222', 'current', 'baseline', 'adc_temp', 'board_temp')
+
+###############################################################
+# --tstart/--tstop strings (YYYY/MM/DD-hh:mm:ss or None) to the
+# epoch window used by tmc_plot_v5.py
+def time_window(tstart, tstop):
+    tstart_ts = 0 if tstart is None else int(tmc_io.decode_stamps([tstart])[0])
+    tstop_ts = 0xFFFFFFFF if tstop is None else int(tmc_io.decode_stamps([tstop])[0])
+    return tstart_ts, tstop_ts
+
+###############################################################
+# Resolve a file list into its system channel number (a string
+# like '00', None if there is no 2N2222 file) and the
+# (filename, stream, column) of every file it names
+def read_file_list(file_list):
+    sch = None
+    adc = 0
+    bd = 0
+    sources = []
+    f_data = open(file_list)
+    for line in f_data:
+        filename = line.strip()
+        if not filename or filename[0] == '#':
+            continue
+        if '2N2222' in filename:
+            sch = (filename.split('-'))[1].split('_')[0]
+            adc, ch, bd = tmc_io.channel_map(sch)
+            sources.append((filename, '2n2222', 0))
+        elif 'TestCurrent' in filename:
+            sources.append((filename, 'current', adc))
+        elif 'ADCBaseline' in filename:
+            sources.append((filename, 'baseline', adc))
+        elif 'ADCTemps' in filename:
+            sources.append((filename, 'adc_temp', adc))
+        elif 'BoardTemps' in filename:
+            sources.append((filename, 'board_temp', bd))
+    f_data.close()
+    return sch, sources
+
+###############################################################
+# The channel lists in a directory, in file name order
+def list_dir(path):
+    return sorted(glob.glob(os.path.join(path, '*_list.txt')))
+
+###############################################################
+# The sources of system channel sch straight from a directory
+# of daily logs, same as a file list naming every day there
+def dir_sources(data_dir, sch):
+    sch = '%02d' % int(sch)
+    adc, ch, bd = tmc_io.channel_map(sch)
+    sources = []
+    for pattern, stream, col in (('2N2222-%s_*.txt' % sch, '2n2222', 0),
+                                 ('TestCurrent_ch%d_*.txt' % ch, 'current', adc),
+                                 ('ADCBaseline_*.txt', 'baseline', adc),
+                                 ('ADCTemps_*.txt', 'adc_temp', adc),
+                                 ('BoardTemps_*.txt', 'board_temp', bd)):
+        for fname in sorted(glob.glob(os.path.join(data_dir, pattern))):
+            sources.append((fname, stream, col))
+    return sch, sources
+
+###############################################################
+# '0-5,18,20-29' to [0, 1, 2, 3, 4, 5, 18, 20, ..., 29]
+def parse_range(text):
+    schs = []
+    for part in text.split(','):
+        if '-' in part:
+            lo, hi = part.split('-')
+            schs.extend(range(int(lo), int(hi) + 1))
+        else:
+            schs.append(int(part))
+    return schs
+
+###############################################################
+# Command line options shared by the multi-channel tools: which
+# channels to load (--file_list, --list_dir, or --data_dir with
+# --channels), the time window and the parse cache
+def add_channel_args(parser):
+    parser.add_argument('--file_list',type=str,action='append',default=[],help='Channel file list (repeatable)')
+    parser.add_argument('--list_dir',type=str,help='Directory of channel file lists (*_list.txt)')
+    parser.add_argument('--data_dir',type=str,help='Directory of daily log files, used with --channels')
+    parser.add_argument('--channels',type=str,help='System channels to take from --data_dir, e.g. 0-7,18-29')
+    parser.add_argument('--tstart',type=str,help='Start time to analyze, format YYYY/MM/DD-hh:mm:ss')
+    parser.add_argument('--tstop',type=str,help='Stop time to analyze, format YYYY/MM/DD-hh:mm:ss')
+    parser.add_argument('--cache_dir',type=str,default='.tmc_cache',help='Directory for the parsed file cache (default: .tmc_cache)')
+    parser.add_argument('--no_cache',help='Always parse the raw text files',action='store_true')
+
+###############################################################
+# Resolve the add_channel_args options: returns (channels,
+# tstart_ts, tstop_ts, store) with channels the (sch, sources)
+# pairs named, in option order, and store a tmc_io.LogStore on
+# the cache. Exits through parser.error if no channel is named.
+def channel_args(parser, args):
+    channels = [read_file_list(file_list) for file_list in args.file_list]
+    if args.list_dir is not None:
+        channels.extend([read_file_list(file_list) for file_list in list_dir(args.list_dir)])
+    if args.data_dir is not None and args.channels is not None:
+        channels.extend([dir_sources(args.data_dir, sch) for sch in parse_range(args.channels)])
+    if not channels:
+        parser.error('no channels: use --list_dir, --file_list or --data_dir with --channels')
+    tstart_ts, tstop_ts = time_window(args.tstart, args.tstop)
+    store = tmc_io.LogStore(None if args.no_cache else args.cache_dir)
+    return channels, tstart_ts, tstop_ts, store
+
+###############################################################
+# Read every stream of one channel from store, files in time
+# order, scaled the way tmc_plot_v5.py scales them (2N2222 and
+# baseline in uV, board temperature in degC). Returns
+# {stream: (ts, data)}.
+def read_streams(store, sources, tstart_ts, tstop_ts):
+    sources = sorted(sources, key=lambda s: store.first_time(s[0], tstart_ts, tstop_ts))
+    series = dict((stream, (tmc_io.GrowArray(np.int64), tmc_io.GrowArray(np.float64)))
+                  for stream in STREAMS)
+    for fname, stream, col in sources:
+        ts, data = store.column(fname, col, tstart_ts, tstop_ts)
+        series[stream][0].extend(ts)
+        series[stream][1].extend(data)
+    streams = {}
+    for stream in STREAMS:
+        if not len(series[stream][0]):
+            raise ValueError('no %s samples in the time window' % stream)
+        streams[stream] = (series[stream][0].array(), series[stream][1].array())
+    streams['2n2222'][1][:] *= 1.E6
+    streams['baseline'][1][:] *= 1.E6
+    streams['board_temp'][1][:] -= 273
+    return streams
+
+###############################################################
+# A channel's own timebase, as tmc_plot_v5.py takes it: its
+# 2N2222 samples less 10 at each end, trimmed to the span all
+# of its streams cover
+def _own_timebase(streams):
+    time_ts = streams['2n2222'][0][10:-10]
+    t_lo = max(streams[stream][0][0] for stream in STREAMS)
+    t_hi = min(streams[stream][0][-1] for stream in STREAMS)
+    return time_ts[(time_ts >= t_lo) & (time_ts <= t_hi)]
+
+###############################################################
+# Align the streams of a list of channels onto time_ts, all in
+# one go, into the chain inputs
+def _align_raw(streams, time_ts):
+    aligned = tmc_align.align(time_ts, [s[stream] for s in streams for stream in STREAMS])
+    aligned = aligned.reshape(len(streams), len(STREAMS), len(time_ts))
+    return {'vt1' : aligned[:, 0],      # 2N2222 signal in microvolts
+            'vi1' : aligned[:, 1]*1.E4, # Excitation current in microvolts
+            'vb1' : aligned[:, 2],      # Baseline in microvolts
+            'tat' : aligned[:, 3],      # ADC temperature in degC
+            'tbt' : aligned[:, 4],      # Board temperature in degC
+            'time': time_ts}            # Timebase in epoch seconds
+
+###############################################################
+# Read the streams of every channel, parsing each shared file
+# once. channels holds (sch, sources) pairs from read_file_list
+# or dir_sources.
+def _read_channels(channels, tstart_ts, tstop_ts, store, jobs):
+    if store is None:
+        store = tmc_io.LogStore()
+    fnames = []
+    for sch, sources in channels:
+        fnames.extend([s[0] for s in sources if s[0] not in fnames])
+    store.preload(fnames, tstart_ts, tstop_ts, jobs)
+    return [read_streams(store, sources, tstart_ts, tstop_ts) for sch, sources in channels]
+
+###############################################################
+# Load a set of channels, each aligned on its own timebase
+# (_own_timebase), so every channel gets exactly what
+# tmc_plot_v5.py run on its list would. Channels with the same
+# timebase (the normal case: one DAQ tick for all) form one
+# group and are aligned together. Returns a list of
+# (schs, time_ts, raw) groups, in the order their first
+# channel appears, with raw holding the chain inputs vt1, vi1,
+# vb1, tat and tbt as (channels x samples) and their timebase
+# time.
+def load_groups(channels, tstart_ts=0, tstop_ts=0xFFFFFFFF, store=None, jobs=1):
+    streams = _read_channels(channels, tstart_ts, tstop_ts, store, jobs)
+    groups = []  # [time_ts, [channel indices]]
+    for i, s in enumerate(streams):
+        time_ts = _own_timebase(s)
+        for group in groups:
+            if np.array_equal(group[0], time_ts):
+                group[1].append(i)
+                break
+        else:
+            groups.append([time_ts, [i]])
+    return [([channels[i][0] for i in members], time_ts,
+             _align_raw([streams[i] for i in members], time_ts))
+            for time_ts, members in groups]
+
+###############################################################
+# Load a set of channel lists onto one timebase: the 2N2222
+# samples of the first channel less 10 at each end (as in
+# tmc_plot_v5.py), trimmed to the span every stream of every
+# channel covers. Shared files are parsed once and streams on
+# the same timebase are aligned together. When the channels
+# are not all on the same ticks the others are interpolated
+# onto those of the first one, which changes their numbers, so
+# this warns; load_groups keeps every channel on its own.
+# channels holds (sch, sources) pairs from read_file_list or
+# dir_sources. Returns (schs, time_ts, raw) with raw holding
+# the chain inputs vt1, vi1, vb1, tat and tbt as
+# (channels x samples) and their timebase time.
+def load_channels(channels, tstart_ts=0, tstop_ts=0xFFFFFFFF, store=None, jobs=1):
+    streams = _read_channels(channels, tstart_ts, tstop_ts, store, jobs)
+    own = [_own_timebase(s) for s in streams]
+    others = [sch for (sch, sources), time_ts in zip(channels, own)
+              if not np.array_equal(time_ts, own[0])]
+    if others:
+        warnings.warn('channels %s are not on the timebase of channel %s and are '
+                      'interpolated onto it' % (', '.join(others), channels[0][0]))
+    time_ts = streams[0]['2n2222'][0][10:-10]
+    t_lo = max(s[stream][0][0] for s in streams for stream in STREAMS)
+    t_hi = min(s[stream][0][-1] for s in streams for stream in STREAMS)
+    time_ts = time_ts[(time_ts >= t_lo) & (time_ts <= t_hi)]
+    return [sch for sch, sources in channels], time_ts, _align_raw(streams, time_ts)
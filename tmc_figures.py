@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+######################################################
+# Figure layouts for the TMC plots.
+#
+# Works on a matplotlib Figure passed in, so the same
+# layout serves the interactive pyplot windows of
+# tmc_plot_v5.py and headless rendering straight to
+# PNG (new_figure + save_png, no pyplot or display).
+#
+# Long series are drawn through DecimatedLine, which
+# keeps the full data but hands the renderer only the
+# first, last, minimum and maximum sample of each pixel
+# column in view, so spikes survive and the cost of a
+# redraw does not grow with the time span. For
+# interactive windows, PyramidLine summarizes the
+# series in a min/max pyramid (tmc_pyramid.py) once,
+# and every pan or zoom fetches only the level that
+# matches the visible window, down to the raw samples.
+######################################################
+
+import numpy as np
+import matplotlib.dates as md
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.collections import LineCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import tmc_io
+import tmc_pyramid
+
+###############################################################
+# Indices of the first and last sample and of the min and max
+# of each of at most npoints equal buckets of y, in order. As a
+# line this looks like all of y at npoints pixels across.
+def minmax_indices(y, npoints):
+    n = len(y)
+    npoints = max(int(npoints), 1)
+    if n <= 2*npoints:
+        return np.arange(n)
+    size = -(-n // npoints)
+    m = n // size * size
+    blocks = y[:m].reshape(-1, size)
+    starts = np.arange(0, m, size)
+    index = [np.array([0, n - 1]),
+             starts + np.argmin(blocks, axis=1),
+             starts + np.argmax(blocks, axis=1)]
+    if m < n:
+        index.append(m + np.array([np.argmin(y[m:]), np.argmax(y[m:])]))
+    return np.unique(np.concatenate(index))
+
+###############################################################
+# x values as floats: datetimes become matplotlib date numbers.
+# datetime64 arrays (tmc_io.epoch_to_local) convert quickly,
+# lists of datetimes cost a few us per sample.
+def _numeric_x(x):
+    x = np.asarray(x)
+    if len(x) and x.dtype == object:
+        x = x.astype('datetime64[us]')
+    if len(x) and x.dtype.kind == 'M':
+        days = (x - x[0])/np.timedelta64(1, 'D')
+        return days + md.date2num(x[0].astype('datetime64[us]').tolist()), True
+    return x.astype(np.float64), False
+
+###############################################################
+# Epoch seconds to matplotlib date numbers in local time
+def epoch_to_num(ts):
+    return _numeric_x(tmc_io.epoch_to_local(ts))[0]
+
+###############################################################
+# A line that holds a whole series and, each time it is drawn,
+# decimates the part inside the x limits to the pixel width of
+# its axes. x must be increasing.
+class DecimatedLine(Line2D):
+    def __init__(self, x, y, **kwargs):
+        Line2D.__init__(self, [], [], **kwargs)
+        self._view = None
+        self.set_series(x, y)
+
+    # Replace the full series (x numeric)
+    def set_series(self, x, y):
+        self.x_full = np.asarray(x, dtype=np.float64)
+        self.y_full = np.asarray(y, dtype=np.float64)
+        self._view = None
+        self._decimate(-np.inf, np.inf, 2000)
+
+    def _decimate(self, x0, x1, npoints):
+        x = self.x_full
+        i0 = max(np.searchsorted(x, x0, 'left') - 1, 0)
+        i1 = min(np.searchsorted(x, x1, 'right') + 1, len(x))
+        index = i0 + minmax_indices(self.y_full[i0:i1], npoints)
+        self.set_data(x[index], self.y_full[index])
+
+    def draw(self, renderer):
+        x0, x1 = self.axes.get_xlim()
+        view = (x0, x1, int(self.axes.bbox.width))
+        if view != self._view:
+            self._view = view
+            self._decimate(x0, x1, view[2])
+        Line2D.draw(self, renderer)
+
+###############################################################
+# A DecimatedLine drawn from a pyramid of its series: a redraw
+# costs a few binary searches and about two points per pixel
+# whatever the span, and zooming in reaches the raw samples.
+class PyramidLine(DecimatedLine):
+    def set_series(self, x, y):
+        self.pyramid = tmc_pyramid.build_pyramid(x, y)
+        DecimatedLine.set_series(self, x, y)
+
+    def _decimate(self, x0, x1, npoints):
+        k = self.pyramid.level_for(x0, x1, npoints)
+        if k < 0:
+            DecimatedLine._decimate(self, x0, x1, npoints)
+            return
+        t0, t1, vmin, vmax = self.pyramid.window(k, x0, x1, 0)[:4]
+        x = np.empty(2*len(t0))
+        y = np.empty(2*len(t0))
+        x[0::2], x[1::2] = t0, t1
+        y[0::2], y[1::2] = vmin, vmax
+        self.set_data(x, y)
+
+###############################################################
+# ax.plot of one long series through a DecimatedLine, or a
+# PyramidLine with pyramid=True; datetime x values switch the
+# axis to dates. Returns the line.
+def plot_decimated(ax, x, y, pyramid=False, **kwargs):
+    x, dates = _numeric_x(x)
+    line = (PyramidLine if pyramid else DecimatedLine)(x, y)
+    proto, = ax.plot(line.get_xdata(), line.get_ydata(), **kwargs)
+    line.update_from(proto)
+    proto.remove()
+    ax.add_line(line)
+    if dates:
+        ax.xaxis_date()
+    return line
+
+###############################################################
+# The five stacked panels of plot_data, 2N2222 at the bottom,
+# as PyramidLines for interactive use with pyramid=True.
+# Returns the axes, bottom first.
+def draw_panels(figure,
+                time_2n2222,     voltage_2n2222,
+                time_current,    current,
+                time_adc_temp,   adc_temp,
+                time_board_temp, board_temp,
+                time_baseline,   baseline,
+                pyramid=False):
+    # The panels usually share one timebase: convert it once
+    converted = {}
+    def numeric(x):
+        if id(x) not in converted:
+            converted[id(x)] = _numeric_x(x)
+        return converted[id(x)][0]
+    ax1 = figure.add_subplot(515)
+    ax1.set_ylabel('2N2222 (uV)')
+    for label in ax1.get_xticklabels():
+        label.set_fontsize(8)
+        label.set_rotation(25)
+    plot_decimated(ax1,numeric(time_2n2222),voltage_2n2222,pyramid)
+    axes = [ax1]
+    for pos, ylabel, t, y in ((514, 'Current (uV)', time_current, current),
+                              (513, 'ATemp (degC)', time_adc_temp, adc_temp),
+                              (512, 'BTemp (degC)', time_board_temp, board_temp),
+                              (511, 'Baseline (uV)', time_baseline, baseline)):
+        ax = figure.add_subplot(pos, sharex=ax1)
+        ax.set_ylabel(ylabel)
+        for label in ax.get_xticklabels():
+            label.set_visible(False)
+        plot_decimated(ax,numeric(t),y,pyramid)
+        axes.append(ax)
+    if any(dates for x, dates in converted.values()):
+        ax1.xaxis_date()
+    figure.set_size_inches(16, 12)
+    return axes
+
+###############################################################
+# The draw_panels figure kept for reuse: the first update lays
+# it out, later ones only swap the line data and rescale, so a
+# worker saving many channels sets matplotlib up once.
+class PanelFigure(object):
+    def __init__(self):
+        self.figure = new_figure()
+        self.axes = None
+
+    # Same arguments as draw_panels
+    def update(self, *series):
+        if self.axes is None:
+            self.axes = draw_panels(self.figure, *series)
+            return self.axes
+        converted = {}
+        for ax, i in zip(self.axes, (0, 2, 4, 6, 8)):
+            x = series[i]
+            if id(x) not in converted:
+                converted[id(x)] = _numeric_x(x)[0]
+            ax.lines[0].set_series(converted[id(x)], series[i + 1])
+            ax.relim()
+        for ax in self.axes:
+            ax.autoscale_view()
+        return self.axes
+
+###############################################################
+# Grid of one small panel per channel, ncols across, all laid
+# out in the data coordinates of a single axes: panel i is one
+# LineCollection through column i of y (points x channels)
+# against date numbers t, clipped to ylim, with a frame and a
+# line at every midnight. Returns the axes.
+def draw_overview(figure, t, y, labels, ncols=6, ylim=(-1, 1), ylabel='mK'):
+    nrows = -(-len(labels) // ncols)
+    t = np.asarray(t, dtype=np.float64)
+    span = max(t[-1] - t[0], 1.E-9)
+    u = (t - t[0])/span*0.9
+    v = (np.clip(y, ylim[0], ylim[1]) - ylim[0])/float(ylim[1] - ylim[0])*0.8
+    days = (np.arange(np.ceil(t[0]), t[-1]) - t[0])/span*0.9
+    ax = figure.add_axes([0.02, 0.02, 0.96, 0.93])
+    frames = []
+    for i, label in enumerate(labels):
+        x0, y0 = i % ncols, nrows - 1 - i // ncols
+        ax.add_collection(LineCollection([np.column_stack((x0 + u, y0 + v[:, i]))], linewidths=0.5))
+        frames.append([(x0, y0), (x0 + 0.9, y0), (x0 + 0.9, y0 + 0.8), (x0, y0 + 0.8), (x0, y0)])
+        frames.extend([[(x0 + d, y0), (x0 + d, y0 + 0.8)] for d in days])
+        ax.text(x0 + 0.01, y0 + 0.78, label, fontsize=8, va='top')
+    ax.add_collection(LineCollection(frames, colors='0.6', linewidths=0.5))
+    ax.text(0, -0.1, '%s to %s, %g to %g %s per panel, lines at midnight' %
+            (md.num2date(t[0]).strftime('%Y/%m/%d-%H:%M:%S'),
+             md.num2date(t[-1]).strftime('%Y/%m/%d-%H:%M:%S'), ylim[0], ylim[1], ylabel),
+            fontsize=9, va='top')
+    ax.set_xlim(-0.05, ncols - 0.05)
+    ax.set_ylim(-0.2, nrows)
+    ax.set_axis_off()
+    figure.set_size_inches(16, 1.5*nrows + 1)
+    return ax
+
+###############################################################
+# A figure that is not managed by pyplot, for saving only
+def new_figure():
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure
+
+###############################################################
+# Save at the DPI the old scripts used for save_dir/<sch>.png
+def save_png(figure, fname):
+    figure.savefig(fname, dpi = 100)
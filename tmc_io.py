@@ -0,0 +1,494 @@
+#!/usr/bin/env python
+
+######################################################
+# Bulk readers for the TMC daily log files.
+#
+# Every log line looks like
+#     YYYY/MM/DD-hh:mm:ss<TAB>v0 v1 v2 ...
+# A whole file is parsed in one vectorized pass into
+# an int64 array of epoch seconds (local time, same as
+# time.mktime) and a float64 (samples x columns) matrix.
+######################################################
+
+import numpy as np
+import calendar
+import hashlib
+import multiprocessing
+import os
+import time
+import warnings
+
+# Width of the fixed 'YYYY/MM/DD-hh:mm:ss' prefix
+TIME_WIDTH = 19
+
+###############################################################
+# Turn 'YYYY/MM/DD-hh:mm:ss' stamps into local epoch seconds
+# (same as time.mktime) straight from the bytes of the fixed
+# width prefix. The wall-clock to epoch offset only needs one
+# time.mktime per day and hour present in the data (per hour
+# so that DST changes land on the right sample); minutes and
+# seconds are plain arithmetic on the digits.
+def decode_stamps(stamps):
+    b = np.array(stamps, dtype='S%d' % TIME_WIDTH)
+    d = b.view(np.uint8).reshape(-1, TIME_WIDTH).astype(np.int64) - ord('0')
+    if len(d) == 0:
+        return np.zeros(0, dtype=np.int64)
+    hour = ((((d[:, 0]*10 + d[:, 1])*10 + d[:, 2])*10 + d[:, 3])*100 +
+            d[:, 5]*10 + d[:, 6])*100 + d[:, 8]*10 + d[:, 9]
+    hour = hour*100 + d[:, 11]*10 + d[:, 12]
+    secs = (d[:, 14]*10 + d[:, 15])*60 + d[:, 17]*10 + d[:, 18]
+    # Lines come in time order, so one lookup per run of equal hours
+    runs = np.flatnonzero(np.concatenate(([True], hour[1:] != hour[:-1])))
+    base = np.empty(len(runs), dtype=np.int64)
+    for i, k in enumerate(hour[runs]):
+        k = int(k)
+        base[i] = int(time.mktime((k//1000000, k//10000 % 100, k//100 % 100, k % 100,
+                                   0, 0, 0, 0, -1)))
+    return np.repeat(base, np.diff(np.append(runs, len(hour)))) + secs
+
+###############################################################
+# Epoch seconds to local wall-clock time as datetime64[s]
+def epoch_to_local(ts):
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) == 0:
+        return np.zeros(0, dtype='datetime64[s]')
+    hours, inv = np.unique(ts // 3600, return_inverse=True)
+    offs = np.array([calendar.timegm(time.localtime(int(h)*3600)) - int(h)*3600
+                     for h in hours], dtype=np.int64)
+    return (ts + offs[inv.ravel()]).astype('datetime64[s]')
+
+###############################################################
+# Epoch seconds back to datetimes, only needed for plotting
+def epoch_to_datetime(ts):
+    if len(ts) == 0:
+        return []
+    return epoch_to_local(ts).tolist()
+
+###############################################################
+# Parse the raw contents of a log file
+def parse_lines(raw):
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    # Line starts and ends straight from the newline offsets, as in
+    # _scan_lines; a last line without its newline still counts
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(buf) and buf[-1] != ord('\n'):
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate(([0], ends[:-1] + 1))[:len(ends)].astype(np.int64)
+    good = (ends - starts) > TIME_WIDTH
+    n = int(np.count_nonzero(good))
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0))
+    short = [(starts[i], ends[i]) for i in np.flatnonzero(~good)]
+    starts = starts[good]
+    ends = ends[good]
+    stamps = buf[starts[:, None] + np.arange(TIME_WIDTH)]
+    ts = decode_stamps(stamps.view('S%d' % TIME_WIDTH).ravel())
+    # Blank the stamps (and their separator) and the short lines:
+    # what is left of the buffer is just the values
+    text = buf.copy()
+    text[starts[:, None] + np.arange(TIME_WIDTH + 1)] = ord(' ')
+    for a, b in short:
+        text[a:b] = ord(' ')
+    # Token starts (non-blank after blank): k per line when there
+    # are n*k of them and row i of the n x k layout falls inside
+    # line i, and then one bulk conversion does the whole buffer
+    blank = (text == ord(' ')) | (text == ord('\t')) | (text == ord('\n')) | (text == ord('\r'))
+    first = ~blank
+    first[1:] &= blank[:-1]
+    tokens = np.flatnonzero(first)
+    if len(tokens) == 0:
+        return ts, np.zeros((n, 0))
+    if len(tokens) % n == 0:
+        ncol = len(tokens) // n
+        tokens = tokens.reshape(n, ncol)
+        if np.all(tokens[:, 0] >= starts) and np.all(tokens[:, -1] < ends):
+            # Bad numbers make fromstring stop short (a warning on
+            # older numpy, a ValueError on newer): leave those to the
+            # slow path, which raises the usual error
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                try:
+                    values = np.fromstring(text.tobytes(), dtype=np.float64, sep=' ')
+                except ValueError:
+                    values = None
+            if values is not None and len(values) == n*ncol:
+                return ts, values.reshape(n, ncol)
+    # Ragged file: fall back to one row at a time, padding with NaN
+    ncol = int(np.bincount(np.searchsorted(ends, tokens.ravel())).max())
+    values = np.empty((n, ncol))
+    values.fill(np.nan)
+    for i in range(n):
+        r = raw[starts[i] + TIME_WIDTH + 1:ends[i]].split()
+        values[i, :len(r)] = np.array(r, dtype=np.float64)
+    return ts, values
+
+###############################################################
+# Parse a whole log file: returns (ts, values)
+def parse_log(fname):
+    f_data = open(fname, 'rb')
+    raw = f_data.read()
+    f_data.close()
+    return parse_lines(raw)
+
+###############################################################
+# On-disk cache of parsed files. Each source file maps to a
+# pair of raw .npy files plus a small text file holding the
+# source path, size and mtime; a change in size or mtime
+# invalidates the entry. Hits are memory mapped, not read.
+def _cache_base(fname, cache_dir):
+    key = hashlib.md5(os.path.abspath(fname).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, key)
+
+def _stat_key(fname):
+    st = os.stat(fname)
+    return '%s\n%d\n%r\n' % (os.path.abspath(fname), st.st_size, st.st_mtime)
+
+def _read_text(fname):
+    try:
+        f_in = open(fname)
+        text = f_in.read()
+        f_in.close()
+        return text
+    except (IOError, OSError):
+        return None
+
+def _write_text(fname, text):
+    tmp = fname + '.tmp'
+    f_out = open(tmp, 'w')
+    f_out.write(text)
+    f_out.close()
+    os.rename(tmp, fname)
+
+def _save_npy(fname, arr):
+    tmp = fname + '.tmp'
+    f_out = open(tmp, 'wb')
+    np.save(f_out, arr)
+    f_out.close()
+    os.rename(tmp, fname)
+
+def cache_valid(fname, cache_dir):
+    return _read_text(_cache_base(fname, cache_dir) + '.meta') == _stat_key(fname)
+
+def cached_parse_log(fname, cache_dir):
+    base = _cache_base(fname, cache_dir)
+    key = _stat_key(fname)
+    if _read_text(base + '.meta') == key:
+        try:
+            return (np.load(base + '.ts.npy', mmap_mode='r'),
+                    np.load(base + '.val.npy', mmap_mode='r'))
+        except (IOError, OSError, ValueError):
+            pass
+    ts, values = parse_log(fname)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    _save_npy(base + '.ts.npy', ts)
+    _save_npy(base + '.val.npy', values)
+    _write_text(base + '.meta', key)
+    return ts, values
+
+###############################################################
+# Byte-offset index: for every minute present in a log, the
+# offset of its first line. Built with a single scan of the
+# timestamps, kept in the cache directory, and extended in
+# place when the (append-only) log grows.
+INDEX_BUCKET = 60
+WINDOW_FRACTION = 0.25    # windows larger than this part of a file parse it whole
+
+# Line starts, ends and stamps of the complete lines in buf
+def _scan_lines(buf, base_offset):
+    buf = np.frombuffer(buf, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], ends[:-1] + 1))[:len(ends)].astype(np.int64)
+    good = (ends - starts) >= TIME_WIDTH
+    starts = starts[good]
+    stamps = buf[starts[:, None] + np.arange(TIME_WIDTH)]
+    end = int(ends[-1]) + 1 if len(ends) else 0
+    return starts + base_offset, stamps, end + base_offset
+
+def _index_chunk(raw, base_offset):
+    starts, stamps, end = _scan_lines(raw, base_offset)
+    buckets = decode_stamps(stamps.view('S%d' % TIME_WIDTH).ravel()) // INDEX_BUCKET
+    # No complete line yet (a touch, or a line half written)
+    # gives no buckets and leaves end at base_offset
+    first = np.ones(len(buckets), dtype=bool)
+    first[1:] = buckets[1:] != buckets[:-1]
+    return buckets[first], starts[first], end, bool(np.all(np.diff(buckets) >= 0))
+
+def build_index(fname, cache_dir):
+    base = _cache_base(fname, cache_dir)
+    st = os.stat(fname)
+    meta = _read_text(base + '.idx.meta')
+    buckets = offsets = None
+    if meta is not None:
+        path, size, mtime, end, ordered = meta.split('\n')[:5]
+        size = int(size)
+        end = int(end)
+        ordered = (ordered == '1')
+        if path == os.path.abspath(fname) and size <= st.st_size:
+            try:
+                idx = np.load(base + '.idx.npy')
+                buckets, offsets = idx[0], idx[1]
+            except (IOError, OSError, ValueError):
+                pass
+        if buckets is not None and size == st.st_size and mtime == repr(st.st_mtime):
+            return buckets, offsets, end, ordered
+    if buckets is None:
+        buckets = offsets = np.zeros(0, dtype=np.int64)
+        end = 0
+        ordered = True
+    f_data = open(fname, 'rb')
+    f_data.seek(end)
+    raw = f_data.read()
+    f_data.close()
+    new_buckets, new_offsets, end, new_ordered = _index_chunk(raw, end)
+    if len(buckets) and len(new_buckets) and new_buckets[0] == buckets[-1]:
+        new_buckets, new_offsets = new_buckets[1:], new_offsets[1:]
+    ordered = ordered and new_ordered and not (
+        len(buckets) and len(new_buckets) and new_buckets[0] < buckets[-1])
+    buckets = np.concatenate((buckets, new_buckets))
+    offsets = np.concatenate((offsets, new_offsets))
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    _save_npy(base + '.idx.npy', np.vstack((buckets, offsets)))
+    _write_text(base + '.idx.meta', '%s\n%d\n%r\n%d\n%d\n' %
+                (os.path.abspath(fname), st.st_size, st.st_mtime, end, ordered))
+    return buckets, offsets, end, ordered
+
+###############################################################
+# Parse only the part of a log inside (tstart_ts, tstop_ts):
+# seek to the bucket holding tstart_ts and stop reading after
+# the bucket holding tstop_ts.
+def read_window(fname, tstart_ts, tstop_ts, cache_dir):
+    buckets, offsets, end, ordered = build_index(fname, cache_dir)
+    if not ordered:
+        ts, values = parse_log(fname)
+        return select_window(ts, values, tstart_ts, tstop_ts)
+    i0 = max(np.searchsorted(buckets, int(tstart_ts) // INDEX_BUCKET, 'right') - 1, 0)
+    i1 = np.searchsorted(buckets, int(tstop_ts) // INDEX_BUCKET, 'right')
+    start = offsets[i0] if len(offsets) else 0
+    stop = offsets[i1] if i1 < len(offsets) else end
+    f_data = open(fname, 'rb')
+    f_data.seek(start)
+    raw = f_data.read(stop - start)
+    f_data.close()
+    ts, values = parse_lines(raw)
+    return select_window(ts, values, tstart_ts, tstop_ts)
+
+###############################################################
+# Part of the time span of a log inside (tstart_ts, tstop_ts),
+# from its first and last complete lines; 1 if it can't tell
+def window_fraction(fname, tstart_ts, tstop_ts):
+    f_data = open(fname, 'rb')
+    head = f_data.readline()
+    f_data.seek(0, 2)
+    f_data.seek(max(f_data.tell() - 4096, 0))
+    tail = [l for l in f_data.read().splitlines()[1:] if len(l) > TIME_WIDTH]
+    f_data.close()
+    if len(head) <= TIME_WIDTH or not tail:
+        return 1.
+    try:
+        t0, t1 = decode_stamps([head[:TIME_WIDTH], tail[-1][:TIME_WIDTH]])
+    except ValueError:
+        return 1.
+    if t1 <= t0:
+        return 1.
+    overlap = min(t1, tstop_ts) - max(t0, tstart_ts)
+    return max(overlap, 0)/float(t1 - t0)
+
+###############################################################
+# Keep only the samples strictly inside (tstart_ts, tstop_ts)
+def select_window(ts, values, tstart_ts, tstop_ts):
+    keep = (ts > tstart_ts) & (ts < tstop_ts)
+    return ts[keep], values[keep]
+
+###############################################################
+# Read one column of a log file inside a time window
+def read_column(fname, col, tstart_ts, tstop_ts):
+    ts, values = parse_log(fname)
+    ts, values = select_window(ts, values, tstart_ts, tstop_ts)
+    return ts, values[:, col]
+
+###############################################################
+# A typed array that grows by doubling, so that appending
+# samples costs amortized O(1) and never boxes a float.
+# array() is a view of the filled part.
+class GrowArray(object):
+    def __init__(self, dtype=np.float64, capacity=1024):
+        self.buf = np.empty(capacity, dtype=dtype)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.buf.dtype)
+        need = self.n + len(values)
+        if need > len(self.buf):
+            new = np.empty(max(need, 2*len(self.buf)), dtype=self.buf.dtype)
+            new[:self.n] = self.buf[:self.n]
+            self.buf = new
+        self.buf[self.n:need] = values
+        self.n = need
+
+    def truncate(self, n):
+        self.n = min(n, self.n)
+
+    def array(self):
+        return self.buf[:self.n]
+
+###############################################################
+# System channel number to (adc, ch, bd): sch = 6*adc + ch,
+# three ADCs per board
+def channel_map(sch):
+    sch = int(sch)
+    adc = sch // 6
+    ch = sch % 6
+    bd = adc // 3
+    return adc, ch, bd
+
+###############################################################
+# Load one file for LogStore.preload, in a worker process.
+# Small windows go through the byte-offset index.
+def _load_worker(job):
+    fname, tstart_ts, tstop_ts, cache_dir = job
+    if tstart_ts is not None:
+        return read_window(fname, tstart_ts, tstop_ts, cache_dir)
+    if cache_dir is not None:
+        ts, values = cached_parse_log(fname, cache_dir)
+        return np.array(ts), np.array(values)
+    return parse_log(fname)
+
+###############################################################
+# Column store: every file is parsed exactly once into a
+# (samples x columns) matrix, and channels get column views
+# of it instead of re-reading the shared files. With a
+# cache_dir, parsed files also persist between runs, and a
+# time window covering only a small part of a file that is
+# not cached yet parses just the indexed byte range it needs
+# (larger windows parse and cache the whole file, so later
+# runs get cache hits).
+class LogStore(object):
+    def __init__(self, cache_dir=None):
+        self.logs = {}
+        self.windows = {}
+        self.cache_dir = cache_dir
+
+    def _store(self, fname, ts, values):
+        self.logs[fname] = (ts, values, bool(np.all(np.diff(ts) >= 0)))
+
+    # Key into self.windows if fname should be read through the
+    # index for this window, None if the whole file is loaded
+    def _window_key(self, fname, tstart_ts, tstop_ts):
+        bounded = (tstart_ts > 0) or (tstop_ts < 0xFFFFFFFF)
+        if (fname not in self.logs and bounded and self.cache_dir is not None
+                and not cache_valid(fname, self.cache_dir)
+                and window_fraction(fname, tstart_ts, tstop_ts) < WINDOW_FRACTION):
+            return (fname, tstart_ts, tstop_ts)
+        return None
+
+    # Parse the file on first use, return (ts, values)
+    def load(self, fname):
+        if fname not in self.logs:
+            if self.cache_dir is not None:
+                ts, values = cached_parse_log(fname, self.cache_dir)
+            else:
+                ts, values = parse_log(fname)
+            self._store(fname, ts, values)
+        return self.logs[fname][:2]
+
+    # Parse everything a run will need up front, fanning the
+    # files out over a pool of jobs worker processes. Cache
+    # hits are just memory mapped here.
+    def preload(self, fnames, tstart_ts, tstop_ts, jobs=1):
+        todo = []
+        for fname in fnames:
+            key = self._window_key(fname, tstart_ts, tstop_ts)
+            if key is not None:
+                job = (fname, tstart_ts, tstop_ts, self.cache_dir)
+                if key not in self.windows and job not in todo:
+                    todo.append(job)
+            elif fname not in self.logs:
+                if self.cache_dir is not None and cache_valid(fname, self.cache_dir):
+                    self.load(fname)
+                elif (fname, None, None, self.cache_dir) not in todo:
+                    todo.append((fname, None, None, self.cache_dir))
+        if jobs > 1 and len(todo) > 1:
+            pool = multiprocessing.Pool(min(jobs, len(todo)))
+            results = pool.map(_load_worker, todo)
+            pool.close()
+            pool.join()
+        else:
+            results = [_load_worker(job) for job in todo]
+        for (fname, t0, t1, cache_dir), (ts, values) in zip(todo, results):
+            if t0 is None:
+                self._store(fname, ts, values)
+            else:
+                self.windows[(fname, t0, t1)] = (ts, values)
+
+    # Column col of fname inside (tstart_ts, tstop_ts). For time
+    # ordered files (the normal case) both arrays are views.
+    def column(self, fname, col, tstart_ts, tstop_ts):
+        key = self._window_key(fname, tstart_ts, tstop_ts)
+        if key is not None:
+            if key not in self.windows:
+                self.windows[key] = read_window(fname, tstart_ts, tstop_ts, self.cache_dir)
+            ts, values = self.windows[key]
+        else:
+            ts, values = self.load(fname)
+        if values.shape[1] == 0:
+            # Nothing read (or an empty log the DAQ has just
+            # created), so not even the number of columns is known
+            return ts[:0], np.zeros(0)
+        if key is not None:
+            return ts, values[:, col]
+        if self.logs[fname][2]:
+            i0 = np.searchsorted(ts, tstart_ts, 'right')
+            i1 = np.searchsorted(ts, tstop_ts, 'left')
+            return ts[i0:i1], values[i0:i1, col]
+        ts, values = select_window(ts, values, tstart_ts, tstop_ts)
+        return ts, values[:, col]
+
+    # First timestamp of fname inside the window, for putting
+    # files back in time order (-1 if there is none)
+    def first_time(self, fname, tstart_ts, tstop_ts):
+        ts = self.column(fname, 0, tstart_ts, tstop_ts)[0]
+        return int(ts[0]) if len(ts) else -1
+
+    def forget(self, fname):
+        self.logs.pop(fname, None)
+        for key in [k for k in self.windows if k[0] == fname]:
+            del self.windows[key]
+
+###############################################################
+# Tail-follow a set of growing logs: remembers the byte offset
+# of the last complete line of every file, and each poll only
+# parses what was appended since. A trailing partial line is
+# left for the next poll.
+class LogFollower(object):
+    def __init__(self, fnames):
+        self.offsets = dict((fname, 0) for fname in fnames)
+
+    # Returns {fname: (ts, values)} for the files that grew
+    def poll(self):
+        new = {}
+        for fname in self.offsets:
+            offset = self.offsets[fname]
+            try:
+                size = os.path.getsize(fname)
+            except OSError:
+                continue
+            if size < offset:
+                # Truncated or replaced: start over
+                offset = 0
+            if size == offset:
+                continue
+            f_data = open(fname, 'rb')
+            f_data.seek(offset)
+            raw = f_data.read(size - offset)
+            f_data.close()
+            end = raw.rfind(b'\n') + 1
+            if end == 0:
+                continue
+            self.offsets[fname] = offset + end
+            new[fname] = parse_lines(raw[:end])
+        return new
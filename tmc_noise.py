@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+######################################################
+# Noise versus averaging time for the corrected
+# 2N2222 signals.
+#
+# Allan deviation (plain and overlapping) at octave
+# spaced averaging times, from one cumulative sum per
+# channel: every tau costs O(n) whatever its length,
+# and all channels go through together along the last
+# axis. Samples are taken as evenly spaced at the
+# median sample interval.
+#
+# Usage:
+#   ./tmc_noise.py --list_dir Mar9_10_2016_list --stream vt3
+######################################################
+
+import numpy as np
+import time
+
+import tmc_channels
+import tmc_pipeline
+
+###############################################################
+# Averaging lengths 1, 2, 4, ... samples, as long as there are
+# at least two full averages to compare
+def octave_lengths(n):
+    lengths = []
+    m = 1
+    while 2*m <= n - 1:
+        lengths.append(m)
+        m *= 2
+    return np.array(lengths, dtype=np.int64)
+
+###############################################################
+# Allan deviation of x along the last axis for each averaging
+# length in lengths (samples): sqrt(<(y[k+m] - y[k])^2>/2)
+# over the m-sample means y. With overlapping, every start k
+# is used, otherwise only k = 0, m, 2m, ...
+# Returns (... x len(lengths)).
+def allan_deviation(x, lengths, overlapping=True):
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-1]
+    c = np.zeros(x.shape[:-1] + (n + 1,))
+    np.cumsum(x - np.mean(x, axis=-1)[..., None], axis=-1, out=c[..., 1:])
+    adev = np.empty(x.shape[:-1] + (len(lengths),))
+    for i, m in enumerate(lengths):
+        m = int(m)
+        step = 1 if overlapping else m
+        # y[k+m] - y[k] = (c[k+2m] - 2c[k+m] + c[k])/m
+        d = (c[..., 2*m:n + 1:step] - 2*c[..., m:n - m + 1:step] + c[..., 0:n - 2*m + 1:step])/m
+        adev[..., i] = np.sqrt(0.5*np.mean(d*d, axis=-1))
+    return adev
+
+###############################################################
+# Overlapping Allan deviation at octave averaging times for
+# (channels x samples) x on timebase t (seconds).
+# Returns (taus in seconds, adev (channels x taus)).
+def noise_curve(x, t, overlapping=True):
+    lengths = octave_lengths(x.shape[-1])
+    return lengths/tmc_pipeline.sample_rate(t), allan_deviation(x, lengths, overlapping)
+
+###############################################################
+# For running independently
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog="tmc_noise",description="Allan deviation of corrected TMC signals.")
+    tmc_channels.add_channel_args(parser)
+    parser.add_argument('--chain',type=str,default='v5',help='Correction chain: v2, v3, v5, regress or a JSON file (default: v5)')
+    parser.add_argument('--stream',type=str,help='Chain stream to analyze (default: the first one marked rms)')
+    parser.add_argument('--non_overlapping',help='Plain instead of overlapping Allan deviation',action='store_true')
+    parser.add_argument('--plot',help='Show the curves on log-log axes',action='store_true')
+    parser.add_argument('--jobs',type=int,default=1,help='Number of processes used to parse the data files (default: 1)')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    channels, tstart_ts, tstop_ts, store = tmc_channels.channel_args(parser, args)
+    schs, time_ts, raw = tmc_channels.load_channels(channels, tstart_ts, tstop_ts, store, args.jobs)
+    chain = tmc_pipeline.load_chain(args.chain)
+    stream = args.stream
+    if stream is None:
+        stream = [spec['out'] for spec in chain if spec.get('rms')][0]
+    result = tmc_pipeline.Pipeline(chain).run(raw)
+    taus, adev = noise_curve(result[stream], time_ts, not args.non_overlapping)
+    mk = adev/2.5
+
+    print('# %s Allan deviation (mK)' % stream)
+    print('%10s  %s' % ('tau (s)', '  '.join(['%8s' % sch for sch in schs])))
+    for i, tau in enumerate(taus):
+        print('%10g  %s' % (tau, '  '.join(['%8.5f' % v for v in mk[:, i]])))
+    lengths = octave_lengths(len(time_ts))
+    for sch, row in zip(schs, mk):
+        i = np.argmin(row)
+        print('%s: lowest %f mK at tau = %g s (window_size = %d)' % (sch, row[i], taus[i], lengths[i]))
+    print('%d channels x %d samples in %.2f s' % (len(schs), len(time_ts), time.time() - t0))
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        for sch, row in zip(schs, mk):
+            plt.loglog(taus, row, label=sch)
+        plt.xlabel('Averaging time (s)')
+        plt.ylabel('%s Allan deviation (mK)' % stream)
+        plt.grid(which='both')
+        plt.legend(fontsize=8)
+        plt.show()
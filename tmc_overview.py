@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+######################################################
+# All-channel overview: the corrected 2N2222 signal of
+# every system channel in mK, one small panel each, in
+# one grid figure.
+#
+# The channels go through the chain together, their
+# outputs are summarized in a min/max pyramid
+# (tmc_pyramid.py) and each panel is one LineCollection
+# through the min and max of the pyramid level that
+# matches the panel width, so a week of 30 channels is
+# drawn from a few hundred points per panel and spikes
+# still show.
+#
+# The pyramid is saved in the parse cache directory,
+# keyed on the source files (path, size and mtime, as
+# tmc_io keys its cache), the time window, the chain and
+# the stream, so drawing the same overview again skips
+# loading and correcting the channels.
+#
+# Usage:
+#   ./tmc_overview.py --list_dir Mar9_10_2016_list --out Mar9_10_2016_all.png
+#   ./tmc_overview.py --data_dir ../Mar10_2016 --channels 0-29 --show
+######################################################
+
+import numpy as np
+import hashlib
+import json
+import os
+import time
+
+import tmc_io
+import tmc_channels
+import tmc_pipeline
+import tmc_pyramid
+import tmc_figures
+
+NPOINTS = 400             # buckets per panel
+
+###############################################################
+# The pyramid level with about npoints buckets over the whole
+# span, -1 if there are fewer samples than that
+def _level(pyramid, npoints):
+    if pyramid.nlevels() == 0:
+        return -1
+    tstart, tstop = pyramid.span()
+    return pyramid.level_for(tstart, tstop, npoints)
+
+###############################################################
+# Min/max envelope of the channels summarized in pyramid with
+# about npoints buckets: (times, points x channels), the min
+# at the first and the max at the last time of each bucket.
+# The (channels x samples) x on epoch times t themselves when
+# there are fewer samples than that.
+def envelope(pyramid, npoints, t=None, x=None):
+    k = _level(pyramid, npoints)
+    if k < 0:
+        return t, x.T
+    tstart, tstop = pyramid.span()
+    t0, t1, vmin, vmax = pyramid.window(k, tstart, tstop)[:4]
+    tv = np.empty(2*len(t0), dtype=np.int64)
+    tv[0::2] = t0
+    tv[1::2] = t1
+    yv = np.empty((2*len(t0), vmin.shape[1]))
+    yv[0::2] = vmin
+    yv[1::2] = vmax
+    return tv, yv
+
+###############################################################
+# Draw the overview of (channels x samples) x in mK on epoch
+# times t into figure, about npoints per panel. With the
+# pyramid of x.T given, t and x are only needed when there are
+# fewer than npoints samples.
+def overview(figure, schs, t, x, npoints=NPOINTS, ncols=6, pyramid=None):
+    if pyramid is None:
+        pyramid = tmc_pyramid.build_pyramid(t, x.T)
+    tv, yv = envelope(pyramid, npoints, t, x)
+    return tmc_figures.draw_overview(figure, tmc_figures.epoch_to_num(tv), yv, schs, ncols)
+
+###############################################################
+# Where the pyramid of an overview is cached: keyed on the
+# source files of channels, the window, the chain and stream
+def cache_base(cache_dir, channels, tstart_ts, tstop_ts, chain, stream):
+    sources = [[sch, [[tmc_io._stat_key(fname), kind, col] for fname, kind, col in srcs]]
+               for sch, srcs in channels]
+    text = json.dumps([sources, int(tstart_ts), int(tstop_ts), chain, stream], sort_keys=True)
+    return os.path.join(cache_dir, 'overview_' + hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+###############################################################
+# For running independently
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog="tmc_overview",description="Overview grid of the corrected signal of many TMC channels.")
+    tmc_channels.add_channel_args(parser)
+    parser.add_argument('--chain',type=str,default='v5',help='Correction chain: v2, v3, v5, regress or a JSON file (default: v5)')
+    parser.add_argument('--stream',type=str,help='Chain stream to draw (default: the final output)')
+    parser.add_argument('--out',type=str,default='overview.png',help='PNG file to write (default: overview.png)')
+    parser.add_argument('--show',help='Open the overview in a window instead of writing a PNG',action='store_true')
+    parser.add_argument('--jobs',type=int,default=1,help='Number of processes used to parse the data files (default: 1)')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    channels, tstart_ts, tstop_ts, store = tmc_channels.channel_args(parser, args)
+    chain = tmc_pipeline.load_chain(args.chain)
+    stream = args.stream if args.stream is not None else chain[-1]['out']
+    schs = [sch for sch, sources in channels]
+    base = None
+    pyramid = None
+    if not args.no_cache:
+        base = cache_base(args.cache_dir, channels, tstart_ts, tstop_ts, chain, stream)
+        pyramid = tmc_pyramid.load_pyramid(base)
+        if pyramid is not None and _level(pyramid, NPOINTS) < 0:
+            # Too short to draw from the pyramid: needs the samples
+            pyramid = None
+    time_ts = x = None
+    if pyramid is None:
+        schs, time_ts, raw = tmc_channels.load_channels(channels, tstart_ts, tstop_ts, store, args.jobs)
+        x = tmc_pipeline.Pipeline(chain).run(raw)[stream]/-2.5
+        pyramid = tmc_pyramid.build_pyramid(time_ts, x.T)
+        if base is not None:
+            if not os.path.isdir(args.cache_dir):
+                os.makedirs(args.cache_dir)
+            tmc_pyramid.save_pyramid(base, pyramid)
+    if time_ts is not None:
+        nsamp = len(time_ts)
+    else:
+        nsamp = int(np.sum(pyramid.count[:int(pyramid.offsets[1])]))
+    t1 = time.time()
+
+    if args.show:
+        import matplotlib.pyplot as plt
+        figure = plt.figure()
+    else:
+        figure = tmc_figures.new_figure()
+    overview(figure, schs, time_ts, x, pyramid=pyramid)
+    figure.suptitle('%s (mK), %d channels' % (stream, len(schs)))
+    if args.show:
+        plt.show()
+    else:
+        tmc_figures.save_png(figure, args.out)
+        print(args.out)
+    print('%d channels x %d samples: %s %.2f s, overview %.2f s' %
+          (len(schs), nsamp, 'load and correct' if x is not None else 'cached pyramid',
+           t1 - t0, time.time() - t1))
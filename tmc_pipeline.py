@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+
+######################################################
+# Correction pipeline for the TMC 2N2222 signals.
+#
+# A correction chain is plain configuration: a list of
+# stages, each naming a stage function, the streams it
+# reads, the stream it writes and its parameters. The
+# stage functions work on whole NumPy arrays along the
+# last axis, so one chain runs a single channel
+# (samples,) or many channels (channels x samples) with
+# no Python loop over samples.
+#
+# The chains from tmc_plot_v2.py, tmc_plot_v3.py and
+# tmc_plot_v5.py, a Butterworth variant of v5 and a
+# fitted 'regress' chain are in CHAINS; other chains
+# can be loaded from a JSON file with the same layout.
+######################################################
+
+import numpy as np
+import hashlib
+import json
+import os
+from scipy import signal
+
+from moving_average import moving_average, moving_average2
+
+###############################################################
+# Stage functions, by name
+STAGES = {}
+
+def stage(name):
+    def register(func):
+        STAGES[name] = func
+        return func
+    return register
+
+###############################################################
+# a - b*scale/divisor
+@stage('subtract')
+def subtract(a, b, scale=1., divisor=1.):
+    return a - b*scale/divisor
+
+###############################################################
+# x - x at the last sample (drift relative to the end)
+@stage('subtract_last')
+def subtract_last(x):
+    return x - x[..., -1:]
+
+###############################################################
+# x - mean(x)
+@stage('mean_subtract')
+def mean_subtract(x):
+    return x - np.mean(x, axis=-1)[..., None]
+
+###############################################################
+# Centered ('same') or pure history moving average
+@stage('moving_average')
+def moving_average_stage(x, window_size=20, history=False):
+    if history:
+        return moving_average2(x, window_size)
+    return moving_average(x, window_size)
+
+###############################################################
+# Gain correction from the baseline, all in uV:
+# g = vb/v0, vt' = (vt - v0)/(1 + gain*(g - 1)) + v0
+@stage('gain_correct')
+def gain_correct(vt, vb, v0=625000., gain=2.):
+    g = 1 + gain*(vb/v0 - 1)
+    return (vt - v0)/g + v0
+
+###############################################################
+# Dynamic resistance correction, with the dynamic resistance
+# taken from the sensor temperature setpoint Tk
+@stage('rd_correct')
+def rd_correct(vt, vi, Tk=180., slope=7.47, intercept=-42.0, i_scale=10000.):
+    Rd = slope*Tk + intercept
+    return vt - (vi/i_scale)*Rd
+
+###############################################################
+# Samples per second from a timebase in seconds
+def sample_rate(t):
+    return 1./np.median(np.diff(t))
+
+###############################################################
+# Butterworth filter as second-order sections, cutoff in Hz
+def butter_sos(cutoff, fs, order=4, btype='low'):
+    return signal.butter(order, cutoff/(0.5*fs), btype=btype, output='sos')
+
+###############################################################
+# Butterworth filter run forward over chunks of samples as
+# they arrive (live data, or a long series a piece at a time).
+# The filter state carries over between chunks, so the output
+# is bit for bit the same as filtering everything in one call.
+# Starts in steady state at the first sample.
+class StreamingSOS(object):
+    def __init__(self, cutoff, fs, order=4, btype='low'):
+        self.sos = butter_sos(cutoff, fs, order, btype)
+        self.zi = None
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if x.shape[-1] == 0:
+            return x.copy()
+        if self.zi is None:
+            zi = signal.sosfilt_zi(self.sos)
+            self.zi = zi.reshape((len(zi),) + (1,)*(x.ndim - 1) + (2,))*x[..., 0][None, ..., None]
+        y, self.zi = signal.sosfilt(self.sos, x, axis=-1, zi=self.zi)
+        return y
+
+###############################################################
+# Zero-phase Butterworth filter (forward and backward), for
+# analysis of a whole series. t is the timebase in seconds
+# the sample rate is measured from.
+@stage('butter_zero_phase')
+def butter_zero_phase(x, t, cutoff=1./120, order=4, btype='low'):
+    return signal.sosfiltfilt(butter_sos(cutoff, sample_rate(t), order, btype), x, axis=-1)
+
+###############################################################
+# Causal Butterworth filter, same output as StreamingSOS gives
+# chunk by chunk
+@stage('butter_causal')
+def butter_causal(x, t, cutoff=1./120, order=4, btype='low'):
+    return StreamingSOS(cutoff, sample_rate(t), order, btype).process(x)
+
+###############################################################
+# Lag of b behind a, per channel: the shift k in
+# [-max_lag, max_lag] maximizing |sum_i a[i]*b[i+k]|. The
+# cross-correlation is one FFT product over the last axis,
+# zero padded so lags up to max_lag do not wrap around.
+def estimate_lag(a, b, max_lag=200):
+    a = a - np.mean(a, axis=-1)[..., None]
+    b = b - np.mean(b, axis=-1)[..., None]
+    n = a.shape[-1]
+    max_lag = int(min(max_lag, n - 1))
+    nfft = 1 << int(np.ceil(np.log2(max(n + max_lag, 2))))
+    corr = np.fft.irfft(np.conj(np.fft.rfft(a, nfft))*np.fft.rfft(b, nfft), nfft)
+    lags = np.arange(-max_lag, max_lag + 1)
+    return lags[np.argmax(np.abs(corr[..., lags]), axis=-1)]
+
+###############################################################
+# x moved back by lag samples per channel (x[i+lag] lands on
+# sample i), holding the first/last value past the ends
+def apply_lag(x, lag):
+    n = x.shape[-1]
+    index = np.clip(np.arange(n) + np.asarray(lag)[..., None], 0, n - 1)
+    return np.take_along_axis(x, np.broadcast_to(index, x.shape), axis=-1)
+
+###############################################################
+# x lined up with ref, e.g. the current, which follows the
+# 2N2222 voltage about a minute later (tmc_plot_v1.py)
+@stage('lag_align')
+def lag_align(ref, x, max_lag=200):
+    return apply_lag(x, estimate_lag(ref, x, max_lag))
+
+###############################################################
+# Columns s0:s1 of the regressors xs, each moved back by its
+# lag, as a (... x samples x regressors) design matrix chunk
+def _design(xs, lags, s0, s1):
+    X = np.empty(xs[0].shape[:-1] + (s1 - s0, len(xs)))
+    for j, (x, lag) in enumerate(zip(xs, lags)):
+        n = x.shape[-1]
+        if np.ndim(lag) == 0 and 0 <= s0 + lag and s1 + lag <= n:
+            X[..., j] = x[..., s0 + lag:s1 + lag]
+        else:
+            index = np.clip(np.arange(s0, s1) + np.asarray(lag)[..., None], 0, n - 1)
+            X[..., j] = np.take_along_axis(x, np.broadcast_to(index, x.shape[:-1] + (s1 - s0,)), axis=-1)
+    return X
+
+###############################################################
+# Least-squares fit of y on the regressors xs (plus an offset)
+# for every channel at once. lags gives a fixed lag per
+# regressor; with max_lag > 0 each channel's lags are found
+# with estimate_lag instead. The normal equations are summed
+# over chunks of samples, so the full design matrix is never
+# built. Returns (beta, lags, means): beta is
+# (... x regressors), means the regressor means the fit is
+# taken about.
+def fit_regression(y, xs, lags=None, max_lag=0, chunk=65536):
+    n = y.shape[-1]
+    if max_lag > 0:
+        lags = [estimate_lag(y, x, max_lag) for x in xs]
+    elif lags is None:
+        lags = [0]*len(xs)
+    # Sums are taken about the unlagged means to keep them small
+    ref_x = np.stack([np.mean(x, axis=-1) for x in xs], axis=-1)
+    ref_y = np.mean(y, axis=-1)
+    k = len(xs)
+    sxx = np.zeros(y.shape[:-1] + (k, k))
+    sx = np.zeros(y.shape[:-1] + (k,))
+    sxy = np.zeros(y.shape[:-1] + (k,))
+    sy = np.zeros(y.shape[:-1])
+    for s0 in range(0, n, chunk):
+        s1 = min(s0 + chunk, n)
+        X = _design(xs, lags, s0, s1)
+        X -= ref_x[..., None, :]
+        Y = y[..., s0:s1] - ref_y[..., None]
+        Xt = np.swapaxes(X, -1, -2)
+        sxx += np.matmul(Xt, X)
+        sx += X.sum(axis=-2)
+        sxy += np.matmul(Xt, Y[..., None])[..., 0]
+        sy += Y.sum(axis=-1)
+    cxx = sxx - sx[..., :, None]*sx[..., None, :]/n
+    cxy = sxy - sx*sy[..., None]/n
+    # Solve on unit-variance columns; a constant regressor gets 0
+    # and (nearly) identical regressors share their coefficient
+    d = np.sqrt(np.maximum(np.einsum('...kk->...k', cxx), 0))
+    d[d == 0] = 1.
+    inv = np.linalg.pinv(cxx/(d[..., :, None]*d[..., None, :]), rcond=1.E-10)
+    beta = np.einsum('...kl,...l->...k', inv, cxy/d)/d
+    return beta, lags, ref_x + sx/n
+
+###############################################################
+# y less its fitted dependence on the regressors xs, e.g. the
+# 2N2222 voltage on the temperatures, current and baseline
+@stage('regress')
+def regress(y, *xs, **params):
+    chunk = params.get('chunk', 65536)
+    beta, lags, means = fit_regression(y, xs, params.get('lags'), params.get('max_lag', 0), chunk)
+    out = np.empty(y.shape)
+    n = y.shape[-1]
+    for s0 in range(0, n, chunk):
+        s1 = min(s0 + chunk, n)
+        X = _design(xs, lags, s0, s1)
+        X -= means[..., None, :]
+        out[..., s0:s1] = y[..., s0:s1] - np.matmul(X, beta[..., None])[..., 0]
+    return out
+
+###############################################################
+# The chains. Every chain starts from the aligned raw signals
+# vt1 (2N2222, uV), vi1 (current, uV), vb1 (baseline, uV),
+# tat (ADC temperature, degC) and tbt (board temperature, degC),
+# plus their timebase time (epoch seconds).
+# 'plot' marks the stages whose output is worth a figure and
+# 'rms' the ones whose RMS is reported. The last stage is the
+# final result.
+CHAINS = {
+    # Gain correction from the baseline, then the dynamic
+    # resistance correction, then the 1 minute average
+    'v5': [
+        {'stage': 'gain_correct', 'in': ['vt1', 'vb1'], 'out': 'vt2',
+         'params': {'v0': 625000., 'gain': 2.}, 'plot': True},
+        {'stage': 'rd_correct', 'in': ['vt2', 'vi1'], 'out': 'vt3',
+         'params': {'Tk': 180.}, 'plot': True, 'rms': True},
+        {'stage': 'moving_average', 'in': ['vt3'], 'out': 'vt4',
+         'params': {'window_size': 20}},
+        {'stage': 'mean_subtract', 'in': ['vt4'], 'out': 'vt4', 'rms': True},
+    ],
+    # Baseline subtraction, then the dynamic resistance
+    # correction, then the 1 minute average
+    'v3': [
+        {'stage': 'subtract', 'in': ['vi1', 'vb1'], 'out': 'vi2'},
+        {'stage': 'subtract', 'in': ['vt1', 'vb1'], 'out': 'vt2', 'plot': True},
+        {'stage': 'rd_correct', 'in': ['vt2', 'vi2'], 'out': 'vt3',
+         'params': {'Tk': 180.}, 'plot': True, 'rms': True},
+        {'stage': 'moving_average', 'in': ['vt3'], 'out': 'vt4',
+         'params': {'window_size': 20}},
+        {'stage': 'mean_subtract', 'in': ['vt4'], 'out': 'vt4', 'rms': True},
+    ],
+    # As v5, with a zero-phase 4th order Butterworth low pass
+    # at 1/120 Hz in place of the 1 minute average
+    'v5_butter': [
+        {'stage': 'gain_correct', 'in': ['vt1', 'vb1'], 'out': 'vt2',
+         'params': {'v0': 625000., 'gain': 2.}, 'plot': True},
+        {'stage': 'rd_correct', 'in': ['vt2', 'vi1'], 'out': 'vt3',
+         'params': {'Tk': 180.}, 'plot': True, 'rms': True},
+        {'stage': 'butter_zero_phase', 'in': ['vt3', 'time'], 'out': 'vt4',
+         'params': {'cutoff': 1./120, 'order': 4}},
+        {'stage': 'mean_subtract', 'in': ['vt4'], 'out': 'vt4', 'rms': True},
+    ],
+    # Fitted ADC temperature, board temperature, current and
+    # baseline dependence taken out, then the 1 minute average
+    'regress': [
+        {'stage': 'regress', 'in': ['vt1', 'tat', 'tbt', 'vi1', 'vb1'], 'out': 'vt3',
+         'plot': True, 'rms': True},
+        {'stage': 'moving_average', 'in': ['vt3'], 'out': 'vt4',
+         'params': {'window_size': 20}},
+        {'stage': 'mean_subtract', 'in': ['vt4'], 'out': 'vt4', 'rms': True},
+    ],
+    # ADC drift from the long baseline average, baseline
+    # subtraction, then the current coupling (/7.7)
+    'v2': [
+        {'stage': 'moving_average', 'in': ['vb1'], 'out': 'bsln_avg',
+         'params': {'window_size': 2000, 'history': True}},
+        {'stage': 'subtract_last', 'in': ['bsln_avg'], 'out': 'offset'},
+        {'stage': 'subtract', 'in': ['vt1', 'offset'], 'out': 'vt_offc'},
+        {'stage': 'subtract', 'in': ['vi1', 'offset'], 'out': 'vi_offc'},
+        {'stage': 'subtract', 'in': ['vb1', 'offset'], 'out': 'vb_offc'},
+        {'stage': 'moving_average', 'in': ['vi_offc'], 'out': 'vi_offc_avg',
+         'params': {'window_size': 20, 'history': True}},
+        {'stage': 'moving_average', 'in': ['vb_offc'], 'out': 'vb_offc_avg',
+         'params': {'window_size': 20, 'history': True}},
+        {'stage': 'subtract', 'in': ['vi_offc_avg', 'vb_offc_avg'], 'out': 'vi_bcor'},
+        {'stage': 'subtract', 'in': ['vt_offc', 'vb_offc_avg'], 'out': 'vt_bcor', 'plot': True},
+        {'stage': 'subtract', 'in': ['vt_bcor', 'vi_bcor'], 'out': 'vt_ccor',
+         'params': {'divisor': 7.7}, 'plot': True, 'rms': True},
+        {'stage': 'moving_average', 'in': ['vt_ccor'], 'out': 'vt_avg',
+         'params': {'window_size': 20}},
+        {'stage': 'mean_subtract', 'in': ['vt_avg'], 'out': 'vt_avg', 'rms': True},
+    ],
+}
+
+###############################################################
+# A chain by name, or from a JSON file holding the same list
+def load_chain(spec):
+    if spec in CHAINS:
+        return CHAINS[spec]
+    f_in = open(spec)
+    chain = json.load(f_in)
+    f_in.close()
+    return chain
+
+###############################################################
+# chain with lag_align stages in front that line streams up
+# with ref, and every later stage reading the lined up copies
+def lagged_chain(chain, streams=('vi1', 'vb1'), ref='vt1', max_lag=200):
+    lagged = []
+    renames = {}
+    for name in streams:
+        lagged.append({'stage': 'lag_align', 'in': [ref, name], 'out': name + '_lag',
+                       'params': {'max_lag': max_lag}})
+        renames[name] = name + '_lag'
+    for spec in chain:
+        spec = dict(spec)
+        spec['in'] = [renames.get(name, name) for name in spec['in']]
+        lagged.append(spec)
+    return lagged
+
+###############################################################
+# Memo of stage outputs keyed by the stage, its parameters and
+# its inputs, in memory and optionally as .npy files in
+# cache_dir. Raw inputs are keyed by content, stage outputs by
+# the key of the stage that made them, so changing a parameter
+# only invalidates that stage and the ones downstream of it.
+def content_key(arr):
+    arr = np.ascontiguousarray(arr)
+    h = hashlib.sha1(arr.view(np.uint8))
+    h.update(repr((arr.shape, arr.dtype.str)).encode('ascii'))
+    return h.hexdigest()
+
+def stage_key(name, params, input_keys):
+    text = repr((name, sorted(params.items()), list(input_keys)))
+    return hashlib.sha1(text.encode('ascii')).hexdigest()
+
+class StageMemo(object):
+    def __init__(self, cache_dir=None):
+        self.mem = {}
+        self.cache_dir = cache_dir
+        self.inputs = {}  # id -> (array, content key)
+
+    # Content key of an input stream, hashed once per array
+    # object; inputs are not expected to change in place
+    def input_key(self, arr):
+        entry = self.inputs.get(id(arr))
+        if entry is None or entry[0] is not arr:
+            entry = (arr, content_key(arr))
+            self.inputs[id(arr)] = entry
+        return entry[1]
+
+    def get(self, key):
+        if key in self.mem:
+            return self.mem[key]
+        if self.cache_dir is not None:
+            fname = os.path.join(self.cache_dir, key + '.npy')
+            if os.path.exists(fname):
+                try:
+                    self.mem[key] = np.load(fname, mmap_mode='r')
+                    return self.mem[key]
+                except (IOError, OSError, ValueError):
+                    pass
+        return None
+
+    def put(self, key, value):
+        self.mem[key] = value
+        if self.cache_dir is not None:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fname = os.path.join(self.cache_dir, key + '.npy')
+            f_out = open(fname + '.tmp', 'wb')
+            np.save(f_out, value)
+            f_out.close()
+            os.rename(fname + '.tmp', fname)
+
+###############################################################
+# A chain resolved against the stage functions up front
+class Pipeline(object):
+    def __init__(self, chain):
+        self.chain = chain
+        self.steps = []
+        for spec in chain:
+            if spec['stage'] not in STAGES:
+                raise ValueError('unknown stage %r' % spec['stage'])
+            self.steps.append((STAGES[spec['stage']], list(spec['in']), spec['out'],
+                               dict(spec.get('params', {}))))
+
+    # Name of the final output stream
+    def output(self):
+        return self.steps[-1][2]
+
+    # Change a parameter of the first stage writing stream out
+    def set_param(self, out, name, value):
+        for i, spec in enumerate(self.chain):
+            if spec['out'] == out:
+                self.steps[i][3][name] = value
+                return
+        raise ValueError('no stage writes %r' % out)
+
+    # Run on a dict of input streams, returns a new dict with
+    # every stage output added. With a StageMemo, stages whose
+    # parameters and inputs are unchanged are not recomputed;
+    # the names of the stages that were are left in recomputed.
+    def run(self, env, memo=None):
+        env = dict(env)
+        self.recomputed = []
+        keys = {}
+        for func, inputs, out, params in self.steps:
+            if memo is None:
+                env[out] = func(*[env[name] for name in inputs], **params)
+                continue
+            for name in inputs:
+                if name not in keys:
+                    keys[name] = memo.input_key(env[name])
+            key = stage_key(func.__name__, params, [keys[name] for name in inputs])
+            value = memo.get(key)
+            if value is None:
+                value = func(*[env[name] for name in inputs], **params)
+                memo.put(key, value)
+                self.recomputed.append(out)
+            env[out] = value
+            keys[out] = key
+        return env
@@ -17,25 +17,8 @@ import time
 import re
 import matplotlib.dates as md
 from scipy import interpolate
+from moving_average import moving_average
 
-###############################################################
-# Take the moving average
-def moving_average(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.convolve(interval, window, 'same')
-    print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        elif i > (len(result)-window_size-1):
-            print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i:])/float(len(result)-i)
-            
-    
-    print result[0],result[len(result)-1]
-    return result
-    
 ###############################################################
 # For returning timestamps
 def timestamp(date):
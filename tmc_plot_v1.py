@@ -17,51 +17,14 @@ import time
 import re
 import matplotlib.dates as md
 from scipy import interpolate
+from moving_average import moving_average, moving_average2
+import tmc_figures
 
 ###############################################################
 # Calculate the mean and normalize it
 def mean_sub_norm(x):
     return ((x-np.mean(x))/np.max(x-np.mean(x)))
 
-###############################################################
-# Take the moving average
-def moving_average(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.convolve(interval, window, 'same')
-    print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        elif i > (len(result)-window_size-1):
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i:])/float(len(result)-i)
-            
-    
-    print result[0],result[len(result)-1]
-    return result
-
-###############################################################
-# Take the moving average.
-# This one is a pure history function: avoids discontinuity at
-# the boundaries
-def moving_average2(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.zeros(len(interval))
-    print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        else:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i-window_size:i])/float(window_size)
-            
-    
-    print result[0],result[len(result)-1]
-    return result
-
-    
 ###############################################################
 # For returning timestamps
 def timestamp(date):
@@ -217,27 +180,27 @@ if __name__ == '__main__':
     ax1 = plt.subplot(515)
     plt.ylabel('2N2222 (uV)')
     plt.setp(ax1.get_xticklabels(), fontsize=8)
-    plt.plot(time_2n2222,voltage_2n2222)
+    tmc_figures.plot_decimated(ax1,time_2n2222,voltage_2n2222)
     
     ax2 = plt.subplot(514, sharex=ax1)
     plt.ylabel('Current (uA)')
     plt.setp(ax2.get_xticklabels(), visible=False)
-    plt.plot(time_current,current)
+    tmc_figures.plot_decimated(ax2,time_current,current)
     
     ax3 = plt.subplot(513, sharex=ax1)
     plt.ylabel('ATemp (degC)')
     plt.setp(ax3.get_xticklabels(), visible=False)
-    plt.plot(time_adc_temp,adc_temp)
+    tmc_figures.plot_decimated(ax3,time_adc_temp,adc_temp)
     
     ax4 = plt.subplot(512, sharex=ax1)
     plt.ylabel('BTemp (degC)')
     plt.setp(ax4.get_xticklabels(), visible=False)
-    plt.plot(time_board_temp,board_temp)
+    tmc_figures.plot_decimated(ax4,time_board_temp,board_temp)
     
     ax5 = plt.subplot(511, sharex=ax1)
     plt.ylabel('Baseline (uV)')
     plt.setp(ax5.get_xticklabels(), visible=False)
-    plt.plot(time_baseline,baseline)
+    tmc_figures.plot_decimated(ax5,time_baseline,baseline)
     # mng = plt.get_current_fig_manager()
     # mng.full_screen_toggle()
     figure = plt.gcf() # get current figure
@@ -284,8 +247,8 @@ if __name__ == '__main__':
     # Calculate the offset drift from the average baseline
     bsln_avg = moving_average2(f_bsln(time_ts),2000)
     offset = bsln_avg - bsln_avg[-1]
-    plt.plot(time_dt,f_bsln(time_ts),color='b')
-    plt.plot(time_dt,bsln_avg,color='r')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,f_bsln(time_ts),color='b')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,bsln_avg,color='r')
     plt.show()
     
     # Correct for ADC offset:
@@ -299,7 +262,7 @@ if __name__ == '__main__':
     sig_offc_btemp = (f_btemp(time_ts)*1000. - offset)/1000.
     
     # # Check these now
-    plt.plot(time_dt,sig_offc_2nv)
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_offc_2nv)
     # plt.show()
     # plt.plot(time_dt,sig_offc_cur)
     # plt.show()
@@ -337,13 +300,13 @@ if __name__ == '__main__':
     # already, and was able to easily able to drift
     # correct it above. atemp is probably more 
     # approriate, though. 
-    plt.plot(time_dt,mean_sub_norm(sig_bsln_2))
-    plt.plot(time_dt,mean_sub_norm(sig_btemp_2))
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_bsln_2))
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_btemp_2))
     plt.ylabel('Baseline and Temperature')
     plt.show()
 
     # Plot the temperature corrected baseline
-    plt.plot(time_dt,mean_sub_norm(sig_bsln_2) - mean_sub_norm(sig_btemp_2))
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_bsln_2) - mean_sub_norm(sig_btemp_2))
     plt.ylabel('Temperature Corrected Baseline')
     plt.show()
 
@@ -353,8 +316,8 @@ if __name__ == '__main__':
     # Study current variation with temperature
     # Current seems to vary pretty directly with temperature,
     # but with a 
-    plt.plot(time_dt[:-100],mean_sub_norm(sig_cur_2[100:]))
-    plt.plot(time_dt,mean_sub_norm(sig_btemp_2))
+    tmc_figures.plot_decimated(plt.gca(),time_dt[:-100],mean_sub_norm(sig_cur_2[100:]))
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_btemp_2))
     plt.ylabel('Current and Temperature')
     plt.show()
 
@@ -362,14 +325,14 @@ if __name__ == '__main__':
     ###########################################
     # Study voltage variations with temperature
     # Interestingly, atemp seems to matter more than btemp
-    plt.plot(time_dt,mean_sub_norm(sig_2nv_2))
-    plt.plot(time_dt,mean_sub_norm(sig_atemp_2)/2)
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_2nv_2))
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_atemp_2)/2)
     plt.ylabel('Voltage and Temperature')
     plt.show()
 
     # Study voltage variation with current
-    plt.plot(time_dt[10:-10],mean_sub_norm(sig_2nv_2[:-20]))
-    plt.plot(time_dt[10:-10],mean_sub_norm(sig_cur_2[20:])/2.)
+    tmc_figures.plot_decimated(plt.gca(),time_dt[10:-10],mean_sub_norm(sig_2nv_2[:-20]))
+    tmc_figures.plot_decimated(plt.gca(),time_dt[10:-10],mean_sub_norm(sig_cur_2[20:])/2.)
     plt.ylabel('Voltage and Current')
     plt.show()
 
@@ -379,7 +342,7 @@ if __name__ == '__main__':
 
 
     # Plot the temperature corrected 2n2222
-    plt.plot(time_dt,mean_sub_norm(sig_2nv_2) - mean_sub_norm(sig_atemp_2)/2)
+    tmc_figures.plot_decimated(plt.gca(),time_dt,mean_sub_norm(sig_2nv_2) - mean_sub_norm(sig_atemp_2)/2)
     plt.ylabel('Temperature Corrected Voltage')
     plt.show()
 
@@ -405,10 +368,10 @@ if __name__ == '__main__':
     
     # Check against board temp again
     # Study voltage variations with temperature
-    plt.plot(time_dt_3,mean_sub_norm(sig_2nv_3))
-    plt.plot(time_dt_3,mean_sub_norm(sig_atemp_3)/3.)
+    tmc_figures.plot_decimated(plt.gca(),time_dt_3,mean_sub_norm(sig_2nv_3))
+    tmc_figures.plot_decimated(plt.gca(),time_dt_3,mean_sub_norm(sig_atemp_3)/3.)
     plt.show()
 
-    plt.plot(time_dt_3,mean_sub_norm(sig_2nv_3) - mean_sub_norm(sig_atemp_3)/3.)
+    tmc_figures.plot_decimated(plt.gca(),time_dt_3,mean_sub_norm(sig_2nv_3) - mean_sub_norm(sig_atemp_3)/3.)
     plt.show()
 
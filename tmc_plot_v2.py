@@ -17,51 +17,14 @@ import time
 import re
 import matplotlib.dates as md
 from scipy import interpolate
+from moving_average import moving_average, moving_average2
+import tmc_figures
 
 ###############################################################
 # Calculate the mean and normalize it
 def mean_sub_norm(x):
     return ((x-np.mean(x))/np.max(x-np.mean(x)))
 
-###############################################################
-# Take the moving average
-def moving_average(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.convolve(interval, window, 'same')
-    # print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        elif i > (len(result)-window_size-1):
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i:])/float(len(result)-i)
-            
-    
-    # print result[0],result[len(result)-1]
-    return result
-
-###############################################################
-# Take the moving average.
-# This one is a pure history function: avoids discontinuity at
-# the boundaries
-def moving_average2(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.zeros(len(interval))
-    # print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        else:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i-window_size:i])/float(window_size)
-            
-    
-    print result[0],result[len(result)-1]
-    return result
-
-    
 ###############################################################
 # For returning timestamps
 def timestamp(date):
@@ -217,27 +180,27 @@ if __name__ == '__main__':
     ax1 = plt.subplot(515)
     plt.ylabel('2N2222 (uV)')
     plt.setp(ax1.get_xticklabels(), fontsize=8)
-    plt.plot(time_2n2222,voltage_2n2222)
+    tmc_figures.plot_decimated(ax1,time_2n2222,voltage_2n2222)
     
     ax2 = plt.subplot(514, sharex=ax1)
     plt.ylabel('Current (uA)')
     plt.setp(ax2.get_xticklabels(), visible=False)
-    plt.plot(time_current,current)
+    tmc_figures.plot_decimated(ax2,time_current,current)
     
     ax3 = plt.subplot(513, sharex=ax1)
     plt.ylabel('ATemp (degC)')
     plt.setp(ax3.get_xticklabels(), visible=False)
-    plt.plot(time_adc_temp,adc_temp)
+    tmc_figures.plot_decimated(ax3,time_adc_temp,adc_temp)
     
     ax4 = plt.subplot(512, sharex=ax1)
     plt.ylabel('BTemp (degC)')
     plt.setp(ax4.get_xticklabels(), visible=False)
-    plt.plot(time_board_temp,board_temp)
+    tmc_figures.plot_decimated(ax4,time_board_temp,board_temp)
     
     ax5 = plt.subplot(511, sharex=ax1)
     plt.ylabel('Baseline (uV)')
     plt.setp(ax5.get_xticklabels(), visible=False)
-    plt.plot(time_baseline,baseline)
+    tmc_figures.plot_decimated(ax5,time_baseline,baseline)
     # mng = plt.get_current_fig_manager()
     # mng.full_screen_toggle()
     figure = plt.gcf() # get current figure
@@ -284,8 +247,8 @@ if __name__ == '__main__':
     # Calculate the offset drift from the average baseline
     bsln_avg = moving_average2(f_bsln(time_ts),2000)
     offset = bsln_avg - bsln_avg[-1]
-    plt.plot(time_dt,f_bsln(time_ts),color='b')
-    plt.plot(time_dt,bsln_avg,color='r',linewidth=2.0)
+    tmc_figures.plot_decimated(plt.gca(),time_dt,f_bsln(time_ts),color='b')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,bsln_avg,color='r',linewidth=2.0)
     plt.xlabel('Date')
     plt.ylabel('Baseline ' + '(' + r'$\mu$'+'V)')
     plt.show()
@@ -310,11 +273,11 @@ if __name__ == '__main__':
     ######################################################################
     # How does the HVAC component of the baseline compare to the current
     # in uV?
-    plt.plot(time_dt,sig_offc_cur_uv_avg-np.mean(sig_offc_cur_uv_avg),color='b')
-    plt.plot(time_dt,sig_offc_bsln_uv_avg-np.mean(sig_offc_bsln_uv_avg),color='g')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_offc_cur_uv_avg-np.mean(sig_offc_cur_uv_avg),color='b')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_offc_bsln_uv_avg-np.mean(sig_offc_bsln_uv_avg),color='g')
     # Do the subtraction and plot on top
     sig_bcor_offc_cur_uv = sig_offc_cur_uv_avg - sig_offc_bsln_uv_avg
-    plt.plot(time_dt,sig_bcor_offc_cur_uv-np.mean(sig_bcor_offc_cur_uv),color='r')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_bcor_offc_cur_uv-np.mean(sig_bcor_offc_cur_uv),color='r')
     plt.ylabel('Current and Baseline ' + '(' + r'$\mu$'+'V)')
     plt.xlabel('Date')
     plt.xticks(rotation=25)
@@ -323,31 +286,31 @@ if __name__ == '__main__':
     #######################################################################
     # Now remove the baseline from the 2n2222 voltage
     sig_bcor_offc_2nv_uv = sig_offc_2nv_uv - sig_offc_bsln_uv_avg
-    plt.plot(time_dt,sig_offc_2nv_uv-np.mean(sig_offc_2nv_uv),color='b')
-    plt.plot(time_dt,sig_bcor_offc_2nv_uv-np.mean(sig_bcor_offc_2nv_uv),color='g')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_offc_2nv_uv-np.mean(sig_offc_2nv_uv),color='b')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_bcor_offc_2nv_uv-np.mean(sig_bcor_offc_2nv_uv),color='g')
     plt.show()
 
     #######################################################################
     # Finally, compare the current to the voltage seen. As a first pass, 
     # plot them mean subtracted, and onthe same scale
     sig_bcor_offc_2nv_uv_avg = moving_average(sig_bcor_offc_2nv_uv,20)
-    plt.plot(time_dt,sig_bcor_offc_2nv_uv_avg-np.mean(sig_bcor_offc_2nv_uv_avg),color='b')
-    plt.plot(time_dt,(sig_bcor_offc_cur_uv-np.mean(sig_bcor_offc_cur_uv))/7.7,color='g')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_bcor_offc_2nv_uv_avg-np.mean(sig_bcor_offc_2nv_uv_avg),color='b')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,(sig_bcor_offc_cur_uv-np.mean(sig_bcor_offc_cur_uv))/7.7,color='g')
     plt.show()
 
     sig_ccor_bcor_offc_2nc_uv = sig_bcor_offc_2nv_uv - sig_bcor_offc_cur_uv/7.7
     rms_2nv = np.std(sig_ccor_bcor_offc_2nc_uv)
     print '2N2222 RMS = %f uV, (%f mK)' % (rms_2nv,rms_2nv/2.5)
-    plt.plot(time_dt,sig_ccor_bcor_offc_2nc_uv)
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_ccor_bcor_offc_2nc_uv)
     sig_ccor_bcor_offc_2nc_uv_avg = moving_average(sig_ccor_bcor_offc_2nc_uv,20)
     plt.ylabel('Corrected 2N2222 Voltage ' + '(' + r'$\mu$'+'V)')
     plt.xlabel('Date')
-    plt.plot(time_dt,sig_ccor_bcor_offc_2nc_uv_avg,'r')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,sig_ccor_bcor_offc_2nc_uv_avg,color='r')
     plt.show()
 
     #######################################################################
     # The result plot, all corrected up
-    plt.plot(time_dt,(sig_ccor_bcor_offc_2nc_uv_avg-np.mean(sig_ccor_bcor_offc_2nc_uv_avg))/-2.5,'b')
+    tmc_figures.plot_decimated(plt.gca(),time_dt,(sig_ccor_bcor_offc_2nc_uv_avg-np.mean(sig_ccor_bcor_offc_2nc_uv_avg))/-2.5,color='b')
     rms_2nv = np.std(sig_ccor_bcor_offc_2nc_uv_avg)
     print '2N2222 RMS = %f uV, (%f mK)' % (rms_2nv,rms_2nv/2.5)
     plt.ylabel('2N2222 Signal (mK)')
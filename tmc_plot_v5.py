@@ -15,53 +15,19 @@ import matplotlib.pyplot as plt
 import datetime as dt
 import time
 import re
+import os
 import matplotlib.dates as md
-from scipy import interpolate
+from moving_average import moving_average, moving_average2
+import tmc_io
+import tmc_align
+import tmc_pipeline
+import tmc_figures
 
 ###############################################################
 # Calculate the mean and normalize it
 def mean_sub_norm(x):
     return ((x-np.mean(x))/np.max(x-np.mean(x)))
 
-###############################################################
-# Take the moving average
-def moving_average(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.convolve(interval, window, 'same')
-    # print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        elif i > (len(result)-window_size-1):
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i:])/float(len(result)-i)
-            
-    
-    # print result[0],result[len(result)-1]
-    return result
-
-###############################################################
-# Take the moving average.
-# This one is a pure history function: avoids discontinuity at
-# the boundaries
-def moving_average2(interval, window_size):
-    window = np.ones(int(window_size))/float(window_size)
-    result = np.zeros(len(interval))
-    # print 'Result is length = %d' % len(result)
-    for i in range(len(result)):
-        if i < window_size:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[:i+1])/float(i+1))
-            result[i] = np.sum(interval[:i+1])/float(i+1)
-        else:
-            #print "%d: replacing %f with %f" % (i,result[i],np.sum(interval[i:])/float(len(result)-i))
-            result[i] = np.sum(interval[i-window_size:i])/float(window_size)
-            
-    
-    print result[0],result[len(result)-1]
-    return result
-
-    
 ###############################################################
 # For returning timestamps
 def timestamp(date):
@@ -98,108 +64,136 @@ def datestr_to_tstop(s_time):
 ###############################################################
 # For reading 2n2222 data from a file
 def read_2n2222(fname, s_data, s_time, verbose, tstart, tstop):
-    tstart_ts = datestr_to_tstart(tstart)
-    tstop_ts = datestr_to_tstop(tstop)
-    f_data = open(fname)
-    n = 0
-    for line in f_data:
-        # print line.split('\t')[1].split(' ')[0]
-        date = re.split(r'[\t:/\n-]\s*',line)
-        now = datetimeit(date)
-        tnow_ts = timestamp(now)
-        # print tstart, tstart_ts, date, tnow_ts, tstop, tstop_ts
-        if (tnow_ts > tstart_ts) and (tnow_ts < tstop_ts):
-                s_time.append(now)
-                s_data.append(float(line.split('\t')[1]))
-        if verbose:
-            print n, line[:-1]
-        n+=1
-    f_data.close()
+    read_log_column(fname, s_data, s_time, verbose, 0, tstart, tstop)
 
 ###############################################################
 # For reading test currents from a file
 def read_current(fname, s_data, s_time, verbose, adc, tstart, tstop):
-    tstart_ts = datestr_to_tstart(tstart)
-    tstop_ts = datestr_to_tstop(tstop)
-    f_data = open(fname)
-    n = 0
-    for line in f_data:
-        date = re.split(r'[\t:/\n-]\s*',line)
-        now = datetimeit(date)
-        tnow_ts = timestamp(now)
-        # s_time.append(timestamp(now))
-        if (tnow_ts > tstart_ts) and (tnow_ts < tstop_ts):
-            s_time.append(now)
-            split_line = line.split('\t')[1].split(' ')
-            s_data.append(float(split_line[adc]))
-        if verbose:
-            print n, line[:-1]
-        n+=1
-    f_data.close()
+    read_log_column(fname, s_data, s_time, verbose, adc, tstart, tstop)
 
 ###############################################################
 # For reading board temperatures
 def read_board_temp(fname, s_data, s_time, verbose, bd, tstart, tstop):
+    read_log_column(fname, s_data, s_time, verbose, bd, tstart, tstop)
+
+###############################################################
+# Parse the whole file in one pass (see tmc_io) and append
+# the requested column. Files shared between channels are
+# only parsed once per process. Times are epoch seconds;
+# datetimes are only made when plotting.
+log_store = tmc_io.LogStore()
+
+def read_log_column(fname, s_data, s_time, verbose, col, tstart, tstop):
     tstart_ts = datestr_to_tstart(tstart)
     tstop_ts = datestr_to_tstop(tstop)
-    f_data = open(fname)
-    n = 0
-    for line in f_data:
-        date = re.split(r'[\t:/\n-]\s*',line)
-        now = datetimeit(date)
-        tnow_ts = timestamp(now)
-        if (tnow_ts > tstart_ts) and (tnow_ts < tstop_ts):
-            s_time.append(now)
-            split_line = line.split('\t')[1].split(' ')
-            s_data.append(float(split_line[bd]))
-        if verbose:
-            print n, line[:-1]
-        n+=1
-    f_data.close()
+    ts, data = log_store.column(fname, col, tstart_ts, tstop_ts)
+    s_time.extend(ts)
+    s_data.extend(data)
+    if verbose:
+        print 'Read %d samples from %s' % (len(ts), fname)
 
 ###############################################################
-# Plot the data
+# Plot the data (panel layout in tmc_figures.py). With fname
+# the figure is also saved there; with show=False it is closed
+# instead of shown. Shown windows reload finer data from a
+# pyramid of each series as you zoom in.
 def plot_data(time_2n2222,     voltage_2n2222,
               time_current,    current,
               time_adc_temp,   adc_temp,
               time_board_temp, board_temp,
-              time_baseline,   baseline):    
-    ax1 = plt.subplot(515)
-    plt.ylabel('2N2222 (uV)')
-    plt.setp(ax1.get_xticklabels(), fontsize=8)
-    plt.xticks(rotation=25)
-    plt.plot(time_2n2222,voltage_2n2222)
-    
-    ax2 = plt.subplot(514, sharex=ax1)
-    plt.ylabel('Current (uV)')
-    plt.setp(ax2.get_xticklabels(), visible=False)
-    plt.plot(time_current,current)
-    
-    ax3 = plt.subplot(513, sharex=ax1)
-    plt.ylabel('ATemp (degC)')
-    plt.setp(ax3.get_xticklabels(), visible=False)
-    plt.plot(time_adc_temp,adc_temp)
-    
-    ax4 = plt.subplot(512, sharex=ax1)
-    plt.ylabel('BTemp (degC)')
-    plt.setp(ax4.get_xticklabels(), visible=False)
-    plt.plot(time_board_temp,board_temp)
-    
-    ax5 = plt.subplot(511, sharex=ax1)
-    plt.ylabel('Baseline (uV)')
-    plt.setp(ax5.get_xticklabels(), visible=False)
-    plt.plot(time_baseline,baseline)
+              time_baseline,   baseline,
+              fname=None,      show=True):
+    figure = plt.gcf()
+    tmc_figures.draw_panels(figure,
+                            time_2n2222,     voltage_2n2222,
+                            time_current,    current,
+                            time_adc_temp,   adc_temp,
+                            time_board_temp, board_temp,
+                            time_baseline,   baseline,
+                            pyramid=show)
     # mng = plt.get_current_fig_manager()
     # mng.full_screen_toggle()
-    figure = plt.gcf() # get current figure
-    figure.set_size_inches(16, 12)
-    # # when saving, specify the DPI
-    # if args.save_dir is not None:
-    #     figure.savefig("./"+args.save_dir+"/"+sch+".png", dpi = 100)
-    #     print "./"+args.save_dir+sch+".png"
-    # else:
-    #     figure.savefig(sch+".png", dpi = 100)
-    plt.show()
+    if fname is not None:
+        tmc_figures.save_png(figure, fname)
+        print fname
+    if show:
+        plt.show()
+    else:
+        plt.close(figure)
+
+###############################################################
+# Follow growing log files: only newly appended lines are
+# parsed, pushed through steps 1-3, and the tail of the
+# 1 minute average is updated in a live plot. With a cutoff
+# (Hz), a streaming Butterworth low pass that carries its
+# state from one update to the next replaces the average.
+def follow_channel(sources, tstart_ts, tstop_ts, interval, verbose, cutoff=None):
+    follower = tmc_io.LogFollower([fname for fname, stream, col in sources])
+    ts = dict((stream, tmc_io.GrowArray(np.int64)) for fname, stream, col in sources)
+    data = dict((stream, tmc_io.GrowArray(np.float64)) for fname, stream, col in sources)
+    t_out = tmc_io.GrowArray(np.float64)
+    vt3 = tmc_io.GrowArray(np.float64)
+    vt4 = tmc_io.GrowArray(np.float64)
+    window_size = 20
+    lowpass = None
+
+    line = None
+    while True:
+        t0 = time.time()
+        new = follower.poll()
+        for fname, stream, col in sources:
+            if fname in new:
+                new_ts, new_values = tmc_io.select_window(new[fname][0], new[fname][1],
+                                                          tstart_ts, tstop_ts)
+                ts[stream].extend(new_ts)
+                data[stream].extend(new_values[:, col])
+
+        # Only correct the 2N2222 samples that every other stream covers
+        done = len(vt3)
+        if all(len(ts[s]) for s in ts):
+            t_max = min(ts[s].array()[-1] for s in ts)
+            n_ok = np.searchsorted(ts['2n2222'].array(), t_max, 'right')
+        else:
+            n_ok = done
+        if n_ok > done:
+            t_new = ts['2n2222'].array()[done:n_ok]
+            vt1 = 1.E6*data['2n2222'].array()[done:n_ok]
+            vi1 = np.interp(t_new, ts['current'].array(), data['current'].array())*1.E4
+            vb1 = np.interp(t_new, ts['baseline'].array(), data['baseline'].array())*1.E6
+            vt3.extend(tmc_pipeline.rd_correct(tmc_pipeline.gain_correct(vt1, vb1), vi1))
+            t_out.extend(md.date2num(tmc_io.epoch_to_datetime(t_new)))
+
+            if cutoff is not None:
+                if lowpass is None:
+                    fs = tmc_pipeline.sample_rate(t_new) if len(t_new) > 1 else 1/3.
+                    lowpass = tmc_pipeline.StreamingSOS(cutoff, fs)
+                vt4.extend(lowpass.process(vt3.array()[done:]))
+            else:
+                # The centered average only changes within a window of the new samples
+                first = max(done - window_size, 0)
+                lo = max(first - window_size, 0)
+                tail = moving_average(vt3.array()[lo:], window_size)
+                vt4.truncate(first)
+                vt4.extend(tail[first-lo:])
+
+            vt4_ms = vt4.array() - np.mean(vt4.array())
+            if line is None:
+                ax = plt.gca()
+                line = tmc_figures.plot_decimated(ax, t_out.array(), vt4_ms/-2.5)
+                ax.xaxis_date()
+                plt.ylabel('2N2222 Signal (mK)')
+                plt.xlabel('Date')
+                plt.xticks(rotation=25)
+                plt.ylim(-1,1)
+            else:
+                line.set_series(t_out.array(), vt4_ms/-2.5)
+                ax.relim()
+                ax.autoscale_view(scaley=False)
+            print '%d new samples, 2N2222 RMS = %f uV, (%f mK), update took %.1f ms' % \
+                (n_ok - done, np.std(vt4_ms), np.std(vt4_ms)/2.5, 1.E3*(time.time()-t0))
+        elif verbose:
+            print 'No new samples'
+        plt.pause(interval)
 
 ###############################################################
 # For running independently
@@ -209,26 +203,50 @@ if __name__ == '__main__':
     parser.add_argument('--file_list',type=str,help='List of datafiles to plot')
     parser.add_argument('--tstart',type=str,help='Start time to analyze, format YYYY/MM/DD-hh:mm:ss')
     parser.add_argument('--tstop',type=str,help='Stop time to analyze, format YYYY/MM/DD-hh:mm:ss')
-    parser.add_argument('--save_dir',type=str,help='Directory in which to save plots')
+    parser.add_argument('--save_dir',type=str,help='Directory in which to save plots (<sch>.png, <sch>_<stage>.png)')
+    parser.add_argument('--no_show',help='Do not open any plot windows (Agg backend, no display needed)',action='store_true')
     parser.add_argument('--version',action='version',version='%(prog)s 4.0')
     parser.add_argument('--verbose',help='Print additional debugging info',action='store_true')
+    parser.add_argument('--cache_dir',type=str,default='.tmc_cache',help='Directory for the parsed file cache (default: .tmc_cache)')
+    parser.add_argument('--no_cache',help='Always parse the raw text files',action='store_true')
+    parser.add_argument('--follow',help='Keep reading new lines as the log files grow',action='store_true')
+    parser.add_argument('--interval',type=float,default=3.,help='Seconds between polls in --follow mode (default: 3)')
+    parser.add_argument('--cutoff',type=float,help='In --follow mode, low pass with a streaming Butterworth filter at this frequency in Hz instead of the 1 minute average')
+    parser.add_argument('--chain',type=str,default='v5',help='Correction chain: v2, v3, v5, regress or a JSON file (default: v5)')
+    parser.add_argument('--jobs',type=int,default=1,help='Number of processes used to parse the data files (default: 1)')
+    parser.add_argument('--set',type=str,action='append',default=[],metavar='OUT.PARAM=VALUE',help='Override a parameter of the chain stage writing OUT, e.g. vt3.Tk=185 (repeatable)')
+    parser.add_argument('--max_lag',type=int,default=0,help='Line the current and baseline up with the 2N2222 signal first: their lags are estimated by FFT cross-correlation, searching up to this many samples (e.g. 40, two minutes), and undone before the corrections. Opt-in (default: 0, off): the peak found on streams without a common swing is noise, and off keeps the results of the original scripts')
+    parser.add_argument('--stage_cache',help='Keep chain stage outputs in the cache directory and only recompute stages whose inputs or parameters changed',action='store_true')
     
     args = parser.parse_args()    
+    if not args.no_cache:
+        log_store.cache_dir = args.cache_dir
+    if args.no_show:
+        plt.switch_backend('Agg')
+    def save_name(suffix=''):
+        if args.save_dir is None:
+            return None
+        if not os.path.isdir(args.save_dir):
+            os.makedirs(args.save_dir)
+        return os.path.join(args.save_dir, sch + suffix + '.png')
     
-    voltage_2n2222 = []
-    time_2n2222 = []
-    baseline = []
-    time_baseline = []
-    current = []
-    time_current = []
-    adc_temp = []
-    time_adc_temp = []
-    board_temp = []
-    time_board_temp = []
+    voltage_2n2222 = tmc_io.GrowArray(np.float64)
+    time_2n2222 = tmc_io.GrowArray(np.int64)
+    baseline = tmc_io.GrowArray(np.float64)
+    time_baseline = tmc_io.GrowArray(np.int64)
+    current = tmc_io.GrowArray(np.float64)
+    time_current = tmc_io.GrowArray(np.int64)
+    adc_temp = tmc_io.GrowArray(np.float64)
+    time_adc_temp = tmc_io.GrowArray(np.int64)
+    board_temp = tmc_io.GrowArray(np.float64)
+    time_board_temp = tmc_io.GrowArray(np.int64)
     adc = 0
     ch = 0
     bd = 0
     
+    ###########################################################################
+    # Resolve the file list up front: (filename, stream, column)
+    sources = []
     f_data = open(args.file_list)
     for filename in f_data:
         if filename[0] is '#':
@@ -236,106 +254,128 @@ if __name__ == '__main__':
             continue;
         if '2N2222' in filename:
             print 'Processing ', filename[:-1]
-            read_2n2222(filename[:-1],voltage_2n2222,time_2n2222,args.verbose,args.tstart,args.tstop)
             sch = (filename.split('-'))[1].split('_')[0] # System channel number: sch = 3*adc + ch
-            ch = int(sch)%6
-            adc = int(sch)/6
-            bd = int(adc/3)
+            adc, ch, bd = tmc_io.channel_map(sch)
+            sources.append((filename[:-1],'2n2222',0))
         elif 'TestCurrent' in filename:
             print 'Processing %s, TestCurrents for %d %d' %(filename[:-1],adc,ch)
-            read_current(filename[:-1],current,time_current,args.verbose,adc,args.tstart,args.tstop)
+            sources.append((filename[:-1],'current',adc))
         elif 'ADCBaseline' in filename:
             print 'Processing %s, ADCBaseline for %d %d' %(filename[:-1],adc,ch)
-            read_current(filename[:-1],baseline,time_baseline,args.verbose,adc,args.tstart,args.tstop)
+            sources.append((filename[:-1],'baseline',adc))
         elif 'ADCTemps' in filename:
             print 'Processing %s, ADCTemps for %d' % (filename[:-1],adc)
-            read_current(filename[:-1],adc_temp,time_adc_temp,args.verbose,adc,args.tstart,args.tstop)
+            sources.append((filename[:-1],'adc_temp',adc))
         elif 'BoardTemps' in filename:
             print 'Processing %s, BoardTemps for %d' % (filename[:-1],bd)
-            read_board_temp(filename[:-1],board_temp,time_board_temp,args.verbose,bd,args.tstart,args.tstop)
-        
-    voltage_2n2222 = [1.E6*x for x in voltage_2n2222]
-    board_temp = [x-273 for x in board_temp]
-    baseline = [1.E6*x for x in baseline]
+            sources.append((filename[:-1],'board_temp',bd))
+    f_data.close()
+    tstart_ts = datestr_to_tstart(args.tstart)
+    tstop_ts = datestr_to_tstop(args.tstop)
 
-    ###########################################################################
-    # Create a bunch of time interpolating functions for all of the variables
-    # (much easier to work with)
-    # First, we need to create all of the timestamps
-    timestamp_2n2222 = [timestamp(x) for x in time_2n2222]
-    timestamp_current = [timestamp(x) for x in time_current]
-    timestamp_baseline = [timestamp(x) for x in time_baseline]
-    timestamp_board_temp = [timestamp(x) for x in time_board_temp]
-    timestamp_adc_temp = [timestamp(x) for x in time_adc_temp]
-    f_2nv = interpolate.interp1d(timestamp_2n2222,voltage_2n2222)
-    f_cur = interpolate.interp1d(timestamp_current,current)
-    f_bsln = interpolate.interp1d(timestamp_baseline,baseline)
-    f_atemp = interpolate.interp1d(timestamp_adc_temp,adc_temp)
-    f_btemp = interpolate.interp1d(timestamp_board_temp,board_temp)
+    if args.follow:
+        follow_channel([s for s in sources if s[1] in ('2n2222','current','baseline')],
+                       tstart_ts,tstop_ts,args.interval,args.verbose,args.cutoff)
+
+    # Parse all of the files in parallel, then merge each series back
+    # together in time order
+    log_store.preload([s[0] for s in sources],tstart_ts,tstop_ts,args.jobs)
+    sources.sort(key=lambda s: log_store.first_time(s[0],tstart_ts,tstop_ts))
+    series = {'2n2222'     : (voltage_2n2222,time_2n2222),
+              'current'    : (current,time_current),
+              'baseline'   : (baseline,time_baseline),
+              'adc_temp'   : (adc_temp,time_adc_temp),
+              'board_temp' : (board_temp,time_board_temp)}
+    for fname, stream, col in sources:
+        read_log_column(fname,series[stream][0],series[stream][1],args.verbose,col,args.tstart,args.tstop)
+        
+    voltage_2n2222, time_2n2222 = voltage_2n2222.array(), time_2n2222.array()
+    baseline, time_baseline = baseline.array(), time_baseline.array()
+    current, time_current = current.array(), time_current.array()
+    adc_temp, time_adc_temp = adc_temp.array(), time_adc_temp.array()
+    board_temp, time_board_temp = board_temp.array(), time_board_temp.array()
+    voltage_2n2222 *= 1.E6
+    board_temp -= 273
+    baseline *= 1.E6
 
     # Create time variables to work with from here out
-    time_dt = time_2n2222[10:-10] # This peels off some problematic boundaries
-    time_ts = [timestamp(x) for x in time_dt]
+    time_ts = time_2n2222[10:-10] # This peels off some problematic boundaries
+    time_dt = tmc_io.epoch_to_local(time_ts) # Only for plotting
 
-    #############################################################
-    # Step 1: Start with the following raw signals
-    vt1 = f_2nv(time_ts) # 2N2222 signal in microvolts
-    vi1 = f_cur(time_ts)*1.E4 # Excitation current in microvolts
-    vb1 = f_bsln(time_ts) # Baseline in microvolts
-    tat = f_atemp(time_ts) # ADC temperature in degC
-    tbt = f_btemp(time_ts) # Board temperature in degC
-    plot_data(time_dt, vt1,
-              time_dt, vi1,
-              time_dt, tat,
-              time_dt, tbt,
-              time_dt, vb1)
+    ###########################################################################
+    # Interpolate all of the variables onto the common timebase in one go
+    # (much easier to work with). The times are already epoch seconds.
+    aligned = tmc_align.align(time_ts, [(time_2n2222,voltage_2n2222),
+                                        (time_current,current),
+                                        (time_baseline,baseline),
+                                        (time_adc_temp,adc_temp),
+                                        (time_board_temp,board_temp)])
 
     #############################################################
-    # Step 2: Generate the gain correction
-    gcorr = [x/625000. for x in vb1]
-    # This gives not great, but not terrible results
-    # gcorr2 = [g*g for g in gcorr]
-    gcorr2 = [1+2*(g-1) for g in gcorr]
-    # This gives not great, but not terrible results
-    for el,el2 in zip(gcorr,gcorr2):
-        print el,el2
-    vi2 = vi1
-    vt2 = [(v - 625000.)/g + 625000. for v,g in zip(vt1,gcorr2)]
-    plot_data(time_dt, vt2,
-              time_dt, vi2,
-              time_dt, tat,
-              time_dt, tbt,
-              time_dt, vb1)
-    print 'gain correction'
+    # Step 1: Start with the following raw signals
+    raw = {'vt1' : aligned[0],      # 2N2222 signal in microvolts
+           'vi1' : aligned[1]*1.E4, # Excitation current in microvolts
+           'vb1' : aligned[2],      # Baseline in microvolts
+           'tat' : aligned[3],      # ADC temperature in degC
+           'tbt' : aligned[4],      # Board temperature in degC
+           'time': time_ts}         # Timebase in epoch seconds
+    plot_data(time_dt, raw['vt1'],
+              time_dt, raw['vi1'],
+              time_dt, raw['tat'],
+              time_dt, raw['tbt'],
+              time_dt, raw['vb1'],
+              save_name(), not args.no_show)
 
     #############################################################
-    # Step 3: Calculate the current correction coefficient,
-    # and apply the dynamic resistance correction.
-    # Probably the simplest way to do this is to calculate the
-    # dynamic resistance from the temperature setpoint for the
-    # sensor.
-    ii2 = vi2/10000
-    Tk = 180.
-    Rd = 7.47*Tk - 42.0
-    vt3 = vt2 - ii2*Rd
-    plot_data(time_dt, vt3,
-              time_dt, vi2,
-              time_dt, tat,
-              time_dt, tbt,
-              time_dt, vb1)
-    rms_vt3 = np.std(vt3)
-    print '2N2222 RMS = %f uV, (%f mK)' % (rms_vt3,rms_vt3/2.5)
+    # Steps 2-4: run the correction chain (see tmc_pipeline.py),
+    # plotting and reporting the stages it marks
+    chain = tmc_pipeline.load_chain(args.chain)
+    if args.max_lag > 0:
+        chain = tmc_pipeline.lagged_chain(chain, max_lag=args.max_lag)
+        for name in ('vi1', 'vb1'):
+            lag = tmc_pipeline.estimate_lag(raw['vt1'], raw[name], args.max_lag)
+            print '%s lags the 2N2222 signal by %d samples' % (name, lag)
+    pipeline = tmc_pipeline.Pipeline(chain)
+    for setting in args.set:
+        target, value = setting.split('=', 1)
+        out, param = target.rsplit('.', 1)
+        pipeline.set_param(out, param, float(value))
+    memo = None
+    if args.stage_cache and not args.no_cache:
+        memo = tmc_pipeline.StageMemo(os.path.join(args.cache_dir, 'stages'))
+    result = pipeline.run(raw, memo)
+    if memo is not None and args.verbose:
+        print 'Recomputed stages: %s' % ', '.join(pipeline.recomputed)
+    if args.verbose:
+        for spec in chain:
+            if spec['stage'] == 'regress':
+                beta = tmc_pipeline.fit_regression(result[spec['in'][0]],
+                                                   [result[name] for name in spec['in'][1:]],
+                                                   **spec.get('params', {}))[0]
+                for name, coeff in zip(spec['in'][1:], beta):
+                    print '%s: %g per unit of %s' % (spec['out'], coeff, name)
+    for spec in chain:
+        if spec.get('plot'):
+            plot_data(time_dt, result[spec['out']],
+                      time_dt, raw['vi1'],
+                      time_dt, raw['tat'],
+                      time_dt, raw['tbt'],
+                      time_dt, raw['vb1'],
+                      save_name('_' + spec['out']), not args.no_show)
+    for spec in chain:
+        if spec.get('rms'):
+            rms = np.std(result[spec['out']])
+            print '2N2222 RMS = %f uV, (%f mK)' % (rms,rms/2.5)
 
     ############################################################
-    # Last but not least, the result as the 1 minute average 
-    vt4 = moving_average(vt3,20)
-    vt4 = vt4 - np.mean(vt4)
-    rms_vt4 = np.std(vt4)
-    print '2N2222 RMS = %f uV, (%f mK)' % (rms_vt4,rms_vt4/2.5)
-    plt.plot(time_dt,vt4/-2.5)
+    # Last but not least, the result
+    tmc_figures.plot_decimated(plt.gca(),time_dt,result[chain[-1]['out']]/-2.5,not args.no_show)
     plt.ylabel('2N2222 Signal (mK)')
     plt.xlabel('Date')
     plt.xticks(rotation=25)
     plt.ylim(-1,1)
-    plt.show()
-
+    if args.save_dir is not None:
+        tmc_figures.save_png(plt.gcf(), save_name('_mK'))
+        print save_name('_mK')
+    if not args.no_show:
+        plt.show()
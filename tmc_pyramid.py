@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+######################################################
+# Multi-resolution summaries of long TMC series.
+#
+# A pyramid holds, for buckets of 2, 4, 8, ... samples,
+# the min, max, sum and count of every column plus the
+# first and last time in the bucket. Each level is
+# reduced from the one below, so building it touches
+# n/2 + n/4 + ... values once, and the samples go
+# through in chunks in a single streaming pass, so a
+# memory-mapped series is never loaded whole. Any time
+# window can then be drawn at screen resolution from
+# the coarsest level that still has enough buckets,
+# with a couple of binary searches and no pass over the
+# raw samples.
+#
+# Pyramids are saved as .npy files (save_pyramid) and
+# memory mapped back (load_pyramid); tmc_overview.py
+# keeps them in the tmc_io cache directory, keyed on the
+# source files and the chain, next to the parsed data.
+######################################################
+
+import numpy as np
+
+import tmc_io
+
+CHUNK = 1 << 16           # samples per pass of the streaming build
+
+###############################################################
+# All levels concatenated: level k (buckets of 2**(k+1)
+# samples) is rows offsets[k]:offsets[k+1] of t0/t1 (first and
+# last time), vmin/vmax/vsum (buckets x columns) and count.
+class Pyramid(object):
+    def __init__(self, t0, t1, vmin, vmax, vsum, count, offsets):
+        self.t0 = t0
+        self.t1 = t1
+        self.vmin = vmin
+        self.vmax = vmax
+        self.vsum = vsum
+        self.count = count
+        self.offsets = offsets
+
+    def nlevels(self):
+        return len(self.offsets) - 1
+
+    # First and last time summarized
+    def span(self):
+        return self.t0[0], self.t1[int(self.offsets[1]) - 1]
+
+    # Rows of level k inside [tstart, tstop]
+    def _rows(self, k, tstart, tstop):
+        lo, hi = int(self.offsets[k]), int(self.offsets[k + 1])
+        i0 = lo + np.searchsorted(self.t1[lo:hi], tstart, 'left')
+        i1 = lo + np.searchsorted(self.t0[lo:hi], tstop, 'right')
+        return i0, max(i0, i1)
+
+    # The finest level with at most max_points buckets inside
+    # [tstart, tstop], or -1 if even the raw samples fit
+    def level_for(self, tstart, tstop, max_points):
+        if self.nlevels() == 0:
+            return -1
+        i0, i1 = self._rows(0, tstart, tstop)
+        if 2*(i1 - i0) <= max_points:
+            return -1
+        k = int(np.ceil(np.log2((i1 - i0)/float(max_points))))
+        return min(max(k, 0), self.nlevels() - 1)
+
+    # (t0, t1, min, max, mean, count) of the buckets of level k
+    # inside [tstart, tstop]; column col or all columns
+    def window(self, k, tstart, tstop, col=None):
+        i0, i1 = self._rows(k, tstart, tstop)
+        cols = slice(None) if col is None else col
+        count = self.count[i0:i1]
+        vsum = self.vsum[i0:i1, cols]
+        mean = vsum/(count if vsum.ndim == 1 else count[:, None])
+        return (self.t0[i0:i1], self.t1[i0:i1], self.vmin[i0:i1, cols],
+                self.vmax[i0:i1, cols], mean, count)
+
+###############################################################
+# Streaming build: add() takes the samples in time order in
+# chunks of any size, finish() returns the Pyramid. Every
+# level pairs up the buckets of the level below as they come
+# in, holding back at most one that still waits for its
+# partner; at the end that one is carried up alone, so the
+# result is the same however the samples were chunked.
+class PyramidBuilder(object):
+    def __init__(self):
+        self.levels = []   # per level: list of bucket blocks
+        self.pending = []  # per level: a bucket waiting for its partner
+        self.fed = []      # per level: number of buckets fed in
+        self.ncol = None
+        self.tdtype = None
+
+    # Add the (samples x columns) values on times ts; a single
+    # series may be passed as a 1-d array
+    def add(self, ts, values):
+        ts = np.asarray(ts)
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        self.ncol = values.shape[1]
+        self.tdtype = ts.dtype
+        if len(ts):
+            self._feed(0, [ts, ts, values, values, values, np.ones(len(ts), dtype=np.int64)])
+
+    # Feed the bucket block items into level k and whatever it
+    # completes into the levels above
+    def _feed(self, k, items):
+        while len(items[0]):
+            if k == len(self.levels):
+                self.levels.append([])
+                self.pending.append(None)
+                self.fed.append(0)
+            self.fed[k] += len(items[0])
+            if self.pending[k] is not None:
+                # Completed by the first new bucket: goes up ahead
+                # of the rest
+                head = _merge(self.pending[k], [a[:1] for a in items])
+                self.pending[k] = None
+                self.levels[k].append(head)
+                self._feed(k + 1, head)
+                items = [a[1:] for a in items]
+            n = len(items[0])
+            m = n - n % 2
+            if m < n:
+                self.pending[k] = [np.array(a[m:]) for a in items]
+            level = _merge([a[0:m:2] for a in items], [a[1:m:2] for a in items])
+            if len(level[0]):
+                self.levels[k].append(level)
+            items = level
+            k += 1
+
+    def finish(self):
+        ncol = 1 if self.ncol is None else self.ncol
+        tdtype = np.int64 if self.tdtype is None else self.tdtype
+        blocks = []
+        sizes = [0]
+        k = 0
+        # Level k exists if more than one bucket went into it
+        while k < len(self.levels) and self.fed[k] > 1:
+            if self.pending[k] is not None:
+                carry, self.pending[k] = self.pending[k], None
+                self.levels[k].append(carry)
+                self._feed(k + 1, carry)
+            blocks.extend(self.levels[k])
+            sizes.append(sum([len(block[0]) for block in self.levels[k]]))
+            k += 1
+        offsets = np.cumsum(sizes)
+        if not blocks:
+            return Pyramid(np.zeros(0, tdtype), np.zeros(0, tdtype), np.zeros((0, ncol)),
+                           np.zeros((0, ncol)), np.zeros((0, ncol)), np.zeros(0, np.int64), offsets)
+        return Pyramid(*([np.concatenate([block[i] for block in blocks]) for i in range(6)] + [offsets]))
+
+# Buckets a[i] and b[i] merged, a first
+def _merge(a, b):
+    return [a[0], b[1], np.minimum(a[2], b[2]), np.maximum(a[3], b[3]), a[4] + b[4], a[5] + b[5]]
+
+###############################################################
+# Build the pyramid of (samples x columns) values on times ts,
+# chunk samples at a time; a single series may be passed as a
+# 1-d array
+def build_pyramid(ts, values, chunk=CHUNK):
+    builder = PyramidBuilder()
+    for i in range(0, max(len(ts), 1), chunk):
+        builder.add(ts[i:i + chunk], values[i:i + chunk])
+    return builder.finish()
+
+###############################################################
+# Save a pyramid as base_t.npy, base_v.npy, base_n.npy and
+# base_o.npy (the level offsets, written last)
+def save_pyramid(base, pyramid):
+    tmc_io._save_npy(base + '_t.npy', np.vstack((pyramid.t0, pyramid.t1)))
+    tmc_io._save_npy(base + '_v.npy', np.stack((pyramid.vmin, pyramid.vmax, pyramid.vsum)))
+    tmc_io._save_npy(base + '_n.npy', pyramid.count)
+    tmc_io._save_npy(base + '_o.npy', np.asarray(pyramid.offsets, dtype=np.int64))
+
+###############################################################
+# The pyramid save_pyramid wrote to base, memory mapped, or
+# None if there is none
+def load_pyramid(base):
+    try:
+        offsets = np.load(base + '_o.npy')
+        t = np.load(base + '_t.npy', mmap_mode='r')
+        v = np.load(base + '_v.npy', mmap_mode='r')
+        n = np.load(base + '_n.npy', mmap_mode='r')
+    except (IOError, OSError, ValueError):
+        return None
+    return Pyramid(t[0], t[1], v[0], v[1], v[2], n, offsets)
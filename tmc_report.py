@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+######################################################
+# Multi-page PDF report of a batch run.
+#
+# A summary page with the per-channel RMS table, then
+# for every channel the figures tmc_plot_v5.py shows
+# one after the other: the raw signals, each stage the
+# chain marks 'plot' over the same current/temperature
+# /baseline panels, and the final signal in mK. Each
+# page is written as soon as it is drawn and its figure
+# cleared, so memory does not grow with the number of
+# channels.
+#
+# Usage:
+#   ./tmc_batch.py --list_dir Mar9_10_2016_list \
+#       --save_dir Mar9_10_2016_plots --report Mar9_10_2016_report.pdf
+######################################################
+
+from matplotlib.backends.backend_pdf import PdfPages
+
+import tmc_io
+import tmc_figures
+
+###############################################################
+# Chain outputs the report draws: the 'plot' stages and the
+# final output
+def report_outs(chain):
+    outs = []
+    for out in [spec['out'] for spec in chain if spec.get('plot')] + [chain[-1]['out']]:
+        if out not in outs:
+            outs.append(out)
+    return outs
+
+###############################################################
+# Write figure as the next page and free its artists
+def _write_page(pdf, figure):
+    pdf.savefig(figure)
+    figure.clear()
+
+###############################################################
+# The RMS table (tmc_batch.format_summary) as a text page
+def _summary_page(pdf, title, summary):
+    figure = tmc_figures.new_figure()
+    figure.set_size_inches(11, 8.5)
+    figure.text(0.05, 0.95, title, fontsize=12, va='top')
+    figure.text(0.05, 0.90, summary, family='monospace', fontsize=8, va='top')
+    _write_page(pdf, figure)
+
+###############################################################
+# The five panels with signal at the bottom
+def _panel_page(pdf, title, t, signal, raw):
+    figure = tmc_figures.new_figure()
+    tmc_figures.draw_panels(figure,
+                            t, signal,
+                            t, raw['vi1'][0],
+                            t, raw['tat'][0],
+                            t, raw['tbt'][0],
+                            t, raw['vb1'][0])
+    figure.suptitle(title)
+    _write_page(pdf, figure)
+
+###############################################################
+# The final signal in mK, as the last v5 plot
+def _mk_page(pdf, title, t, signal):
+    figure = tmc_figures.new_figure()
+    ax = figure.add_subplot(111)
+    tmc_figures.plot_decimated(ax, t, signal/-2.5)
+    ax.set_ylabel('2N2222 Signal (mK)')
+    ax.set_xlabel('Date')
+    for label in ax.get_xticklabels():
+        label.set_rotation(25)
+    ax.set_ylim(-1,1)
+    figure.set_size_inches(16, 12)
+    figure.suptitle(title)
+    _write_page(pdf, figure)
+
+###############################################################
+# Write the report to fname from (matrix, schs) pairs, channel
+# matrices each holding the report_outs of chain for its
+# channels schs
+def write_report(fname, groups, chain, summary):
+    final = chain[-1]['out']
+    pdf = PdfPages(fname)
+    try:
+        _summary_page(pdf, '2N2222 RMS, %d channels' % sum([len(schs) for matrix, schs in groups]),
+                      summary)
+        for matrix, schs in groups:
+            t = tmc_io.epoch_to_local(matrix.time())
+            for sch in schs:
+                raw = matrix.raw([sch])
+                _panel_page(pdf, '%s: raw signals' % sch, t, raw['vt1'][0], raw)
+                for spec in chain:
+                    if spec.get('plot'):
+                        _panel_page(pdf, '%s: %s after %s' % (sch, spec['out'], spec['stage']),
+                                    t, matrix.get(spec['out'], [sch])[0], raw)
+                _mk_page(pdf, '%s: %s' % (sch, final), t, matrix.get(final, [sch])[0])
+    finally:
+        pdf.close()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+######################################################
+# Aligned TMC data for all system channels in shared
+# memory.
+#
+# One float64 (rows x samples) block holds the common
+# time axis, the 2N2222 signal, excitation current and
+# any chain outputs of every system channel (one row
+# per sch), and the signals shared between channels
+# once per ADC (baseline, ADC temperature) or per board
+# (board temperature), following the sch -> (adc, ch,
+# bd) mapping. Worker processes attach to the block by
+# name and read or write their rows in place, so no
+# arrays are pickled between processes.
+#
+# Uses multiprocessing.shared_memory where it exists
+# (Python 3.8+), otherwise a file in /dev/shm mapped
+# with np.memmap.
+######################################################
+
+import numpy as np
+import os
+import tempfile
+
+import tmc_io
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+NSCH = 30                 # system channels
+NADC = NSCH // 6          # six channels per ADC
+NBD = (NADC + 2) // 3     # three ADCs per board
+
+###############################################################
+# A named float64 array in shared memory. create=True makes a
+# new one (with a fresh name if none is given), otherwise an
+# existing one is attached by name.
+class SharedArray(object):
+    _count = 0
+
+    def __init__(self, shape, name=None, create=False):
+        shape = tuple(shape)
+        nbytes = max(int(np.prod(shape))*8, 1)
+        self.shape = shape
+        if shared_memory is not None:
+            self.shm = shared_memory.SharedMemory(name=name, create=create, size=nbytes)
+            self.name = self.shm.name
+            self.array = np.ndarray(shape, np.float64, buffer=self.shm.buf)
+        else:
+            if name is None:
+                SharedArray._count += 1
+                name = 'tmc_%d_%d' % (os.getpid(), SharedArray._count)
+            self.shm = None
+            self.name = name
+            self.array = np.memmap(self.path(), np.float64, 'w+' if create else 'r+', shape=shape)
+
+    # File backing the array when there is no shared_memory
+    def path(self):
+        shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return os.path.join(shm_dir, self.name)
+
+    # Detach; views of self.array must not be used after this
+    def close(self):
+        self.array = None
+        if self.shm is not None:
+            self.shm.close()
+
+    # Free the memory once every process has closed it
+    def unlink(self):
+        if self.shm is not None:
+            self.shm.unlink()
+        elif os.path.exists(self.path()):
+            os.remove(self.path())
+
+###############################################################
+# Row layout of a channel matrix with extra per-sch rows for
+# the chain outputs outs: {stream: (first row, rows)}
+def _layout(outs):
+    layout = {}
+    nrows = 0
+    for stream, count in ((('time', 1), ('vt1', NSCH), ('vi1', NSCH), ('vb1', NADC),
+                           ('tat', NADC), ('tbt', NBD)) +
+                          tuple((out, NSCH) for out in outs)):
+        layout[stream] = (nrows, count)
+        nrows += count
+    return layout, nrows
+
+###############################################################
+# All system channels on one timebase in one shared block.
+# Rows of channels that were not loaded are NaN.
+class ChannelMatrix(object):
+    def __init__(self, nsamp, outs=(), name=None, create=False):
+        self.nsamp = nsamp
+        self.outs = tuple(outs)
+        self.layout, nrows = _layout(self.outs)
+        self.shared = SharedArray((nrows, nsamp), name, create)
+        self.name = self.shared.name
+        if create:
+            self.shared.array[:] = np.nan
+
+    # What another process needs to attach: (name, nsamp, outs)
+    def descriptor(self):
+        return (self.name, self.nsamp, self.outs)
+
+    @classmethod
+    def attach(cls, descriptor):
+        name, nsamp, outs = descriptor
+        return cls(nsamp, outs, name)
+
+    # Rows of stream for the system channels schs
+    def rows(self, stream, schs):
+        first, count = self.layout[stream]
+        index = []
+        for sch in schs:
+            if not 0 <= int(sch) < NSCH:
+                raise ValueError('system channel %s out of range' % sch)
+            adc, ch, bd = tmc_io.channel_map(sch)
+            if count == NSCH:
+                index.append(first + int(sch))
+            elif count == NADC:
+                index.append(first + adc)
+            elif count == NBD:
+                index.append(first + bd)
+            else:
+                index.append(first)
+        return np.array(index, dtype=np.intp)
+
+    # (len(schs) x samples) of stream; a view when the rows are
+    # consecutive, e.g. the 2N2222 rows of a run of channels
+    def get(self, stream, schs):
+        index = self.rows(stream, schs)
+        block = self.shared.array
+        if len(index) and np.all(np.diff(index) == 1):
+            return block[index[0]:index[-1] + 1]
+        return block[index]
+
+    def put(self, stream, schs, data):
+        self.shared.array[self.rows(stream, schs)] = data
+
+    def time(self):
+        return self.shared.array[self.layout['time'][0]]
+
+    # Chain inputs of schs, as load_channels returns them
+    def raw(self, schs):
+        raw = dict((stream, self.get(stream, schs))
+                   for stream in ('vt1', 'vi1', 'vb1', 'tat', 'tbt'))
+        raw['time'] = self.time()
+        return raw
+
+    # Copy in the output of tmc_channels.load_channels
+    def fill(self, schs, time_ts, raw):
+        self.shared.array[self.layout['time'][0]] = time_ts
+        for stream in ('vt1', 'vi1', 'vb1', 'tat', 'tbt'):
+            self.put(stream, schs, raw[stream])
+
+    def close(self):
+        self.shared.close()
+
+    def unlink(self):
+        self.shared.unlink()
+
+###############################################################
+# Split schs into at most n runs of consecutive entries
+def split_channels(schs, n):
+    n = max(1, min(n, len(schs)))
+    bounds = np.linspace(0, len(schs), n + 1).astype(int)
+    return [list(schs[bounds[i]:bounds[i + 1]]) for i in range(n)]
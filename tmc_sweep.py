@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+######################################################
+# Parameter sweeps over a correction chain.
+#
+# A grid of stage parameters is run through the chain
+# in one go: every swept parameter becomes a
+# (points x 1 x 1) array, so the stage functions
+# broadcast it against the (channels x samples) inputs
+# and work on (points x channels x samples) blocks.
+# Stages ahead of the first swept one run once; the
+# rest run over the grid in chunks of points sized to
+# a memory budget. The RMS of every stage the chain
+# marks 'rms' is reported per grid point and channel.
+#
+# Usage:
+#   ./tmc_sweep.py --list_dir Mar9_10_2016_list \
+#       --grid vt3.Tk=170:190:2 --grid vt2.gain=1.5,2,2.5
+######################################################
+
+import numpy as np
+import itertools
+import time
+
+import tmc_channels
+import tmc_pipeline
+
+###############################################################
+# 'OUT.PARAM=VALUES' to (out, param, values). VALUES is either
+# a comma separated list or start:stop:step with stop included.
+def parse_grid(spec):
+    target, text = spec.split('=', 1)
+    out, param = target.rsplit('.', 1)
+    if ':' in text:
+        start, stop, step = [float(x) for x in text.split(':')]
+        values = start + step*np.arange(int(round((stop - start)/step)) + 1)
+    else:
+        values = np.array([float(x) for x in text.split(',')])
+    return out, param, values
+
+###############################################################
+# Run chain over every point of the grid, a list of
+# (out, param, values). raw holds the (channels x samples)
+# chain inputs. Returns (points, rms): points is
+# (points x params) with one column per grid entry, rms maps
+# every 'rms' stage output to a (points x channels) array.
+def sweep(chain, raw, grid, max_bytes=256.E6):
+    points = np.array(list(itertools.product(*[values for out, param, values in grid])))
+    outs = [spec['out'] for spec in chain]
+    first = min(outs.index(out) for out, param, values in grid)
+    env = tmc_pipeline.Pipeline(chain[:first]).run(raw)
+    rest = tmc_pipeline.Pipeline(chain[first:])
+
+    nchan, nsamp = raw['vt1'].shape
+    chunk = int(max_bytes // (8.*nchan*nsamp*(len(rest.steps) + 1)))
+    chunk = max(1, min(chunk, len(points)))
+    rms = dict((spec['out'], np.empty((len(points), nchan)))
+               for spec in chain if spec.get('rms'))
+    for p0 in range(0, len(points), chunk):
+        block = points[p0:p0 + chunk]
+        for i, (out, param, values) in enumerate(grid):
+            rest.set_param(out, param, block[:, i, None, None])
+        result = rest.run(env)
+        for out in rms:
+            rms[out][p0:p0 + chunk] = np.std(result[out], axis=-1)
+    return points, rms
+
+###############################################################
+# For running independently
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog="tmc_sweep",description="Sweep correction chain parameters over TMC channels.")
+    tmc_channels.add_channel_args(parser)
+    parser.add_argument('--chain',type=str,default='v5',help='Correction chain: v2, v3, v5, regress or a JSON file (default: v5)')
+    parser.add_argument('--grid',type=str,action='append',default=[],metavar='OUT.PARAM=VALUES',help='Parameter of the stage writing OUT to sweep, as a,b,c or start:stop:step (repeatable)')
+    parser.add_argument('--max_mb',type=float,default=256.,help='Memory budget for one chunk of grid points in MB (default: 256)')
+    parser.add_argument('--jobs',type=int,default=1,help='Number of processes used to parse the data files (default: 1)')
+    args = parser.parse_args()
+
+    if not args.grid:
+        parser.error('need at least one --grid')
+
+    t0 = time.time()
+    channels, tstart_ts, tstop_ts, store = tmc_channels.channel_args(parser, args)
+    schs, time_ts, raw = tmc_channels.load_channels(channels, tstart_ts, tstop_ts,
+                                                    store, args.jobs)
+    t1 = time.time()
+    grid = [parse_grid(spec) for spec in args.grid]
+    chain = tmc_pipeline.load_chain(args.chain)
+    points, rms = sweep(chain, raw, grid, args.max_mb*1.E6)
+    t2 = time.time()
+
+    # One row per grid point: the parameters, then the RMS of the
+    # last 'rms' stage in mK averaged over channels and per channel
+    final = [spec['out'] for spec in chain if spec.get('rms')][-1]
+    mk = rms[final]/2.5
+    names = ['%s.%s' % (out, param) for out, param, values in grid]
+    print('%s  %10s  %s' % ('  '.join(['%12s' % n for n in names]), 'mean (mK)',
+                            '  '.join(['%8s' % sch for sch in schs])))
+    for point, row in zip(points, mk):
+        print('%s  %10.6f  %s' % ('  '.join(['%12g' % v for v in point]), np.mean(row),
+                                  '  '.join(['%8.6f' % v for v in row])))
+    best = np.argmin(np.mean(mk, axis=1))
+    print('Best: %s, %s RMS = %f mK' % (', '.join(['%s=%g' % (n, v) for n, v in zip(names, points[best])]),
+                                       final, np.mean(mk[best])))
+    print('%d channels x %d samples, %d grid points: load %.2f s, sweep %.2f s' %
+          (len(schs), len(time_ts), len(points), t1 - t0, t2 - t1))